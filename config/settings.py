@@ -172,6 +172,33 @@ else:
     }
 
 
+# Caché compartido entre workers: las invalidaciones del dashboard y del catálogo de
+# servicios oficiales (versiones en el caché) deben verlas todos los procesos.
+# REDIS_URL (ej: redis://localhost:6379/1) usa Redis; sin Redis, en producción se
+# usa un caché en archivos (compartido por los workers de un mismo servidor).
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+elif DEBUG:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("DJANGO_CACHE_DIR", str(BASE_DIR / "cache")),
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -268,11 +295,63 @@ if not DEBUG:
     
 
 
+# Segundos máximos que vive en caché el dashboard de un usuario (también se invalida al
+# cambiar sus datos y a medianoche)
+DASHBOARD_CACHE_SECONDS = int(os.getenv("DASHBOARD_CACHE_SECONDS", "3600"))
+# Edad máxima de la copia en memoria del catálogo de servicios oficiales en cada worker
+# (se relee antes si cambia su versión en el caché compartido)
+SERVICE_CATALOG_MAX_AGE_SECONDS = int(os.getenv("SERVICE_CATALOG_MAX_AGE_SECONDS", "300"))
+
+
+# Recordatorios (send_reminders)
+REMINDERS_LOG_CHUNK_SIZE = int(os.getenv("REMINDERS_LOG_CHUNK_SIZE", "500"))
+# Mensajes planificados que se reclaman en el ledger de una sola vez
+REMINDERS_PLAN_CHUNK_SIZE = int(os.getenv("REMINDERS_PLAN_CHUNK_SIZE", "500"))
+# Un reclamo sin confirmar más viejo que esto se considera de una corrida caída
+REMINDERS_CLAIM_STALE_MINUTES = int(os.getenv("REMINDERS_CLAIM_STALE_MINUTES", "30"))
+# Mensajes que toma cada worker de drain_outbox por vuelta
+REMINDERS_OUTBOX_BATCH_SIZE = int(os.getenv("REMINDERS_OUTBOX_BATCH_SIZE", "200"))
+# Reintentos de envíos fallidos (vía outbox): intentos máximos y backoff exponencial con jitter
+REMINDERS_RETRY_MAX_ATTEMPTS = int(os.getenv("REMINDERS_RETRY_MAX_ATTEMPTS", "5"))
+REMINDERS_RETRY_BASE_SECONDS = int(os.getenv("REMINDERS_RETRY_BASE_SECONDS", "60"))
+REMINDERS_RETRY_MAX_SECONDS = int(os.getenv("REMINDERS_RETRY_MAX_SECONDS", "3600"))
+# Fallos seguidos que abren el circuito de un canal, y cuánto tiempo queda abierto
+REMINDERS_BREAKER_THRESHOLD = int(os.getenv("REMINDERS_BREAKER_THRESHOLD", "5"))
+REMINDERS_BREAKER_COOLDOWN_SECONDS = int(os.getenv("REMINDERS_BREAKER_COOLDOWN_SECONDS", "120"))
+REMINDERS_EMAIL_BATCH_SIZE = int(os.getenv("REMINDERS_EMAIL_BATCH_SIZE", "100"))
+# Hilos por canal en el dispatcher de recordatorios
+REMINDERS_EMAIL_WORKERS = int(os.getenv("REMINDERS_EMAIL_WORKERS", "4"))
+# WhatsApp ya envía en paralelo dentro de cada hilo (asyncio), ver WHATSAPP_MAX_IN_FLIGHT
+REMINDERS_WHATSAPP_WORKERS = int(os.getenv("REMINDERS_WHATSAPP_WORKERS", "1"))
+REMINDERS_WHATSAPP_BATCH_SIZE = int(os.getenv("REMINDERS_WHATSAPP_BATCH_SIZE", "100"))
+REMINDERS_PUSH_WORKERS = int(os.getenv("REMINDERS_PUSH_WORKERS", "4"))
+# Recordatorios push por lote del dispatcher (salen en llamadas a FCM de hasta 500 tokens)
+REMINDERS_PUSH_BATCH_SIZE = int(os.getenv("REMINDERS_PUSH_BATCH_SIZE", "500"))
+# Reparto justo entre clientes en el dispatcher: peso por clase (mensajes por vuelta del
+# round-robin), tope de mensajes de un mismo cliente por lote mientras otros esperan, y
+# mensajes que se acumulan por canal antes de armar lotes (más buffer, más se puede intercalar)
+REMINDERS_TENANT_WEIGHTS = os.getenv("REMINDERS_TENANT_WEIGHTS", "empresa=4,individual=1")
+REMINDERS_TENANT_QUOTA = int(os.getenv("REMINDERS_TENANT_QUOTA", "50"))
+REMINDERS_FAIR_BUFFER = int(os.getenv("REMINDERS_FAIR_BUFFER", "2000"))
+# Cada cuánto se revisa si cambiaron las plantillas de recordatorio (ReminderTemplate)
+REMINDERS_TEMPLATES_CHECK_SECONDS = int(os.getenv("REMINDERS_TEMPLATES_CHECK_SECONDS", "60"))
+# Hora local (TIME_ZONE) a la que run_reminder_daemon envía los recordatorios del día
+REMINDERS_SEND_HOUR = int(os.getenv("REMINDERS_SEND_HOUR", "8"))
+# Archivo .prom para el textfile collector de node-exporter (vacío: no se escriben métricas)
+REMINDERS_METRICS_FILE = os.getenv("REMINDERS_METRICS_FILE", "")
+# Carpeta de los JSONL comprimidos de archive_notification_logs
+REMINDERS_LOG_ARCHIVE_DIR = os.getenv("REMINDERS_LOG_ARCHIVE_DIR", str(BASE_DIR / "archive" / "notification_logs"))
+
+
 # WhatsApp configuration (simulada por ahora)
 WHATSAPP_ENABLED = env_bool("WHATSAPP_ENABLED", False)
 WHATSAPP_API_KEY = os.getenv("WHATSAPP_API_KEY", "")
 WHATSAPP_PHONE_NUMBER = os.getenv("WHATSAPP_PHONE_NUMBER", "")
 WHATSAPP_BUSINESS_ID = os.getenv("WHATSAPP_BUSINESS_ID", "")
+# Ritmo de envío hacia Twilio: mensajes/seg, ráfaga máxima y peticiones simultáneas
+WHATSAPP_RATE_PER_SECOND = float(os.getenv("WHATSAPP_RATE_PER_SECOND", "10"))
+WHATSAPP_BURST = int(os.getenv("WHATSAPP_BURST", "20"))
+WHATSAPP_MAX_IN_FLIGHT = int(os.getenv("WHATSAPP_MAX_IN_FLIGHT", "10"))
 
 
 
@@ -290,6 +369,15 @@ BASE_URL = os.getenv('BASE_URL', 'http://localhost:8000')
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER', '')
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL', 'https://api.twilio.com')
+
+
+# Firebase Cloud Messaging (push). Vacío = canal push deshabilitado
+FIREBASE_CREDENTIALS = os.getenv('FIREBASE_CREDENTIALS', '')
+# Reemplazo de firebase_admin.messaging para pruebas de carga (ej: reminders.standins.FakeMessaging)
+FIREBASE_MESSAGING_BACKEND = os.getenv('FIREBASE_MESSAGING_BACKEND', '')
+STANDIN_FCM_LATENCY = float(os.getenv('STANDIN_FCM_LATENCY', '0'))
+STANDIN_FCM_ERROR_RATE = float(os.getenv('STANDIN_FCM_ERROR_RATE', '0'))
 
 
 # Configuración de axes
@@ -0,0 +1,21 @@
+"""
+Números de versión en el caché compartido para invalidar datos derivados:
+quien lee arma su clave con la versión actual y quien cambia algo la sube.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    # Si la versión no existe (caché vacío o expulsada) arranca de un valor nuevo, nunca de 0:
+    # así no reaparece un dato guardado con una versión ya usada
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
@@ -0,0 +1,78 @@
+"""
+Caché por usuario de los datos del dashboard (estadísticas, vigencias y vehículos).
+
+La clave lleva un número de versión por usuario que las señales de core.signals
+suben cuando cambia un Vehicle, Vigencia, Documento o Profile suyo, y la fecha
+local: los días restantes cambian a medianoche, así que la entrada del día
+anterior deja de usarse sola. La versión vive en el caché compartido (CACHES
+en config/settings.py), así un cambio hecho en un worker invalida en todos.
+"""
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import cache_versions
+from .models import PlanChoices, Profile, Vehicle, Vigencia
+
+HITS_KEY = "dashboard:hits"
+MISSES_KEY = "dashboard:misses"
+
+
+def _version_key(user_id):
+    return f"dashboard:version:{user_id}"
+
+
+def get_version(user_id):
+    return cache_versions.get_version(_version_key(user_id))
+
+
+def bump_version(user_id):
+    """Invalida el dashboard de un usuario"""
+    cache_versions.bump_version(_version_key(user_id))
+
+
+def _seconds_until_midnight(today):
+    midnight = timezone.make_aware(datetime.combine(today + timedelta(days=1), dt_time.min))
+    return max(1, int((midnight - timezone.now()).total_seconds()))
+
+
+def _count(key):
+    # incr es atómico en Redis, Memcached y LocMemCache; en FileBasedCache (el de producción
+    # sin REDIS_URL) es leer y reescribir el archivo, así que con varios workers a la vez
+    # se pierden cuentas: ahí los hits/misses son aproximados
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def cache_stats():
+    """{'hits': n, 'misses': n} del caché del dashboard (aproximados sin incr atómico, ver _count)"""
+    return {"hits": cache.get(HITS_KEY, 0), "misses": cache.get(MISSES_KEY, 0)}
+
+
+def build_dashboard_data(user, today):
+    activas = Vigencia.objects.filter(vehicle__owner=user, activo=True)
+    profile = Profile.objects.filter(user=user).only("plan").first()
+    return {
+        "stats": activas.stats(today),
+        "vigencias": list(activas.select_related("vehicle").with_dias_restantes(today).order_by("fecha_vencimiento")),
+        "vehicles": list(Vehicle.objects.filter(owner=user)),
+        "plan": profile.plan if profile else PlanChoices.FREE,
+    }
+
+
+def get_dashboard_data(user, today=None):
+    """Datos del dashboard de `user`, del caché si la versión y el día coinciden"""
+    today = today or timezone.localdate()
+    key = f"dashboard:{user.pk}:{get_version(user.pk)}:{today.isoformat()}"
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+    _count(MISSES_KEY)
+    data = build_dashboard_data(user, today)
+    cache.set(key, data, timeout=min(settings.DASHBOARD_CACHE_SECONDS, _seconds_until_midnight(today)))
+    return data
@@ -1,13 +1,22 @@
 import firebase_admin
 from firebase_admin import credentials, messaging
 from django.conf import settings
+from django.utils.module_loading import import_string
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Máximo de mensajes (o tokens) por llamada a FCM
+MULTICAST_LIMIT = 500
+
 class FirebaseService:
     def __init__(self):
+        if settings.FIREBASE_MESSAGING_BACKEND:
+            # Reemplazo local de firebase_admin.messaging (ej: reminders.standins.FakeMessaging)
+            self.messaging = import_string(settings.FIREBASE_MESSAGING_BACKEND)()
+            return
+        self.messaging = messaging
         if not firebase_admin._apps:
             # Cargar credenciales desde variable de entorno
             cred_dict = json.loads(settings.FIREBASE_CREDENTIALS)
@@ -17,8 +26,8 @@ class FirebaseService:
     def send_push_notification(self, fcm_token, title, body, data=None):
         """Envía notificación push a un dispositivo"""
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
+            message = self.messaging.Message(
+                notification=self.messaging.Notification(
                     title=title,
                     body=body,
                 ),
@@ -26,7 +35,7 @@ class FirebaseService:
                 token=fcm_token,
             )
             
-            response = messaging.send(message)
+            response = self.messaging.send(message)
             logger.info(f"Push enviado: {response}")
             return True, response
             
@@ -35,30 +44,64 @@ class FirebaseService:
             return False, str(e)
     
     def send_multicast(self, tokens, title, body, data=None):
-        """Envía notificación a múltiples dispositivos"""
+        """Envía notificación a múltiples dispositivos (en llamadas de hasta 500 tokens)"""
         try:
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                tokens=tokens,
-            )
-            
-            response = messaging.send_multicast(message)
+            responses = []
+            for start in range(0, len(tokens), MULTICAST_LIMIT):
+                message = self.messaging.MulticastMessage(
+                    notification=self.messaging.Notification(
+                        title=title,
+                        body=body,
+                    ),
+                    data=data or {},
+                    tokens=tokens[start:start + MULTICAST_LIMIT],
+                )
+                responses.extend(self.messaging.send_each_for_multicast(message).responses)
+
+            response = self.messaging.BatchResponse(responses)
             logger.info(f"Multicast enviado: {response.success_count} éxitos")
             return True, response
-            
+
         except Exception as e:
             logger.error(f"Error en multicast: {str(e)}")
             return False, str(e)
-    
+
+    def build_message(self, fcm_token, title, body, data=None):
+        return self.messaging.Message(
+            notification=self.messaging.Notification(
+                title=title,
+                body=body,
+            ),
+            data=data or {},
+            token=fcm_token,
+        )
+
+    def send_each(self, messages):
+        """
+        Envía mensajes distintos en llamadas de hasta 500 y retorna un
+        SendResponse por mensaje, en el mismo orden. Si falla una llamada
+        entera, sus mensajes quedan con esa excepción.
+        """
+        responses = []
+        for start in range(0, len(messages), MULTICAST_LIMIT):
+            chunk = messages[start:start + MULTICAST_LIMIT]
+            try:
+                responses.extend(self.messaging.send_each(chunk).responses)
+            except Exception as e:
+                logger.error(f"Error en envío por lotes: {str(e)}")
+                responses.extend(self.messaging.SendResponse(None, e) for _ in chunk)
+        return responses
+
+    @staticmethod
+    def is_dead_token(exception):
+        """El token ya no sirve (app desinstalada, token de otro proyecto)"""
+        return isinstance(exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+
     def send_topic_notification(self, topic, title, body, data=None):
         """Envía notificación a un topic (ej: 'pro_users')"""
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
+            message = self.messaging.Message(
+                notification=self.messaging.Notification(
                     title=title,
                     body=body,
                 ),
@@ -66,7 +109,7 @@ class FirebaseService:
                 topic=topic,
             )
             
-            response = messaging.send(message)
+            response = self.messaging.send(message)
             return True, response
             
         except Exception as e:
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_documento_fcmtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vigencia',
+            index=models.Index(fields=['activo', 'fecha_vencimiento'], name='core_vigenc_activo_c25c8c_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+def fill_notification_mask(apps, schema_editor):
+    Profile = apps.get_model('core', 'Profile')
+    profiles = list(Profile.objects.only('id', 'notification_days'))
+    for profile in profiles:
+        days = [int(day) for day in profile.notification_days or [30, 15, 7, 1]]
+        # Hasta ahora el día del vencimiento se avisaba siempre: se conserva como día marcado
+        if 0 not in days:
+            days.append(0)
+        mask = 0
+        for day in days:
+            if 0 <= day <= 30:
+                mask |= 1 << day
+        profile.notification_days = days
+        profile.notification_mask = mask
+    Profile.objects.bulk_update(profiles, ['notification_days', 'notification_mask'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_vigencia_activo_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='notification_mask',
+            field=models.PositiveIntegerField(default=1073774723, editable=False),
+        ),
+        migrations.RunPython(fill_notification_mask, migrations.RunPython.noop),
+    ]
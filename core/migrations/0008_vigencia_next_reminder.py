@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 14:00
+
+from datetime import date, timedelta
+
+from django.db import migrations, models
+
+
+REMINDER_OFFSETS = (30, 15, 7, 1, 0)
+DEFAULT_MASK = (1 << 30) | (1 << 15) | (1 << 7) | (1 << 1) | (1 << 0)
+
+
+def fill_next_reminder(apps, schema_editor):
+    Vigencia = apps.get_model('core', 'Vigencia')
+    Profile = apps.get_model('core', 'Profile')
+    masks = dict(Profile.objects.values_list('user_id', 'notification_mask'))
+    today = date.today()
+
+    last_id = 0
+    while True:
+        batch = list(
+            Vigencia.objects.filter(id__gt=last_id, activo=True)
+            .annotate(owner_id=models.F('vehicle__owner_id'))
+            .order_by('id')[:1000]
+        )
+        if not batch:
+            return
+        for v in batch:
+            mask = masks.get(v.owner_id, DEFAULT_MASK)
+            v.next_reminder_at = v.next_reminder_offset = None
+            for offset in REMINDER_OFFSETS:
+                enabled = mask & (1 << offset) and (offset == 0 or getattr(v, f'r{offset}'))
+                fecha = v.fecha_vencimiento - timedelta(days=offset)
+                if enabled and fecha >= today:
+                    v.next_reminder_at, v.next_reminder_offset = fecha, offset
+                    break
+        Vigencia.objects.bulk_update(batch, ['next_reminder_at', 'next_reminder_offset'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_profile_notification_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vigencia',
+            name='next_reminder_at',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='vigencia',
+            name='next_reminder_offset',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vigencia',
+            index=models.Index(fields=['activo', 'next_reminder_at'], name='core_vigenc_activo_962db7_idx'),
+        ),
+        migrations.RunPython(fill_next_reminder, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_vigencia_next_reminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vigencia',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='vigencia',
+            index=models.Index(fields=['updated_at'], name='core_vigenc_updated_97f126_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0 on 2026-10-18 19:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_vigencia_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Empresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=200)),
+                ('nit', models.CharField(max_length=20, unique=True)),
+                ('telefono', models.CharField(blank=True, max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('direccion', models.TextField(blank=True)),
+                ('ciudad', models.CharField(default='Bogotá', max_length=100)),
+                ('plan_empresa', models.CharField(choices=[('BASIC', 'Básico (10 vehículos)'), ('STANDARD', 'Estándar (50 vehículos)'), ('PREMIUM', 'Premium (200 vehículos)'), ('ENTERPRISE', 'Enterprise (Ilimitado)')], default='BASIC', max_length=20)),
+                ('max_vehiculos', models.IntegerField(default=10)),
+                ('max_usuarios', models.IntegerField(default=3)),
+                ('activa', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_vencimiento', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Empresa',
+                'verbose_name_plural': 'Empresas',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsuarioEmpresa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rol', models.CharField(choices=[('ADMIN', 'Administrador'), ('GERENTE', 'Gerente de flota'), ('OPERADOR', 'Operador'), ('VISOR', 'Solo lectura')], default='OPERADOR', max_length=20)),
+                ('departamento', models.CharField(blank=True, max_length=100)),
+                ('telefono_extension', models.CharField(blank=True, max_length=10)),
+                ('fecha_ingreso', models.DateField(auto_now_add=True)),
+                ('activo', models.BooleanField(default=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usuarios', to='core.empresa')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('empresa', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_empresa_usuarioempresa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['owner', 'id'], name='core_vehicl_owner_i_cfc85f_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.db import models
 from django.utils import timezone
+from datetime import timedelta
 from django.core.validators import MinLengthValidator
 from .validators import validar_placa_colombiana
 from django.core.validators import RegexValidator
@@ -13,6 +14,22 @@ class PlanChoices(models.TextChoices):
     PRO = "PRO", "Pro"
 
 
+DEFAULT_NOTIFICATION_DAYS = [30, 15, 7, 1, 0]
+
+# Días antes del vencimiento en los que puede salir un recordatorio (0 = vence hoy)
+REMINDER_OFFSETS = (30, 15, 7, 1, 0)
+
+
+def notification_days_mask(days):
+    """[30, 7] -> entero con el bit `d` encendido por cada día de aviso (0..30)"""
+    mask = 0
+    for day in days:
+        day = int(day)
+        if 0 <= day <= 30:
+            mask |= 1 << day
+    return mask
+
+
 class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
     plan = models.CharField(max_length=10, choices=PlanChoices.choices, default=PlanChoices.FREE)
@@ -21,6 +38,10 @@ class Profile(models.Model):
     whatsapp_notifications = models.BooleanField(default=True)  
     email_notifications = models.BooleanField(default=True)    
     notification_days = models.JSONField(default=list)         
+    # notification_days como bitmask (bit d = avisar d días antes)
+    notification_mask = models.PositiveIntegerField(
+        default=notification_days_mask(DEFAULT_NOTIFICATION_DAYS), editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)           
 
@@ -29,8 +50,30 @@ class Profile(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.notification_days:
-            self.notification_days = [30, 15, 7, 1]
+            self.notification_days = list(DEFAULT_NOTIFICATION_DAYS)
+        self.notification_mask = notification_days_mask(self.notification_days)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "notification_days" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "notification_mask"}
+        mask_changed = self.pk and self.notification_mask != getattr(self, "_loaded_mask", None)
         super().save(*args, **kwargs)
+        self._loaded_mask = self.notification_mask
+        self._loaded_plan = self.plan
+        if mask_changed:
+            # Cambiaron los días de aviso: recalcular el próximo recordatorio de sus vigencias
+            Vigencia.objects.filter(vehicle__owner_id=self.user_id).refresh_next_reminder()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_mask = instance.__dict__.get("notification_mask")
+        instance._loaded_plan = instance.__dict__.get("plan")
+        return instance
+
+    @property
+    def dashboard_changed(self):
+        """Si cambió algo que muestra el dashboard (el plan) desde que se cargó"""
+        return self.plan != getattr(self, "_loaded_plan", None)
 
 
 class Vehicle(models.Model):
@@ -49,6 +92,8 @@ class Vehicle(models.Model):
         indexes = [
             models.Index(fields=['owner', 'created_at']),
             models.Index(fields=['plate']),
+            # Rango por (owner_id, id) de las páginas de send_reminders (reminders.selection)
+            models.Index(fields=['owner', 'id']),
         ]
 
     def __str__(self):
@@ -63,6 +108,140 @@ class VigenciaType(models.TextChoices):
     OTRO = "OTRO", "Otro"
 
 
+def next_reminder(fecha_vencimiento, offsets, from_date):
+    """(fecha, offset) del primer recordatorio en o después de `from_date`, o (None, None)"""
+    for offset in sorted(offsets, reverse=True):
+        fecha = fecha_vencimiento - timedelta(days=offset)
+        if fecha >= from_date:
+            return fecha, offset
+    return None, None
+
+
+def owner_notification_masks(owner_ids):
+    """{owner_id: notification_mask}; los dueños sin perfil usan los días por defecto"""
+    masks = dict(
+        Profile.objects.filter(user_id__in=owner_ids).values_list("user_id", "notification_mask")
+    )
+    default = notification_days_mask(DEFAULT_NOTIFICATION_DAYS)
+    return {owner_id: masks.get(owner_id, default) for owner_id in owner_ids}
+
+
+def _bump_dashboards(owner_ids):
+    """Invalida el dashboard de cada dueño (core.dashboard_cache), para cambios que no mandan señales"""
+    # Import tardío: dashboard_cache importa este módulo
+    from .dashboard_cache import bump_version
+
+    for owner_id in owner_ids:
+        if owner_id:
+            bump_version(owner_id)
+
+
+class DaysUntil(models.Func):
+    """Días enteros desde `today` hasta la fecha de `expression`, calculados en la base de datos"""
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, models.Value(today, output_field=models.DateField()), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(", **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="DATEDIFF(%(expressions)s)", arg_joiner=", ", **extra_context,
+        )
+
+
+class VigenciaQuerySet(models.QuerySet):
+    # Campos de los que depende next_reminder_at
+    SCHEDULE_FIELDS = {"fecha_vencimiento", "activo", "r30", "r15", "r7", "r1", "vehicle", "vehicle_id"}
+    # ids por tramo al recalcular después de update()
+    REFRESH_CHUNK_SIZE = 1000
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        vehicle_owners = dict(
+            Vehicle.objects.filter(id__in={o.vehicle_id for o in objs}).values_list("id", "owner_id")
+        )
+        masks = owner_notification_masks(set(vehicle_owners.values()))
+        today = timezone.localdate()
+        for obj in objs:
+            obj.set_next_reminder(masks.get(vehicle_owners.get(obj.vehicle_id)), today)
+        created = super().bulk_create(objs, *args, **kwargs)
+        # bulk_create no manda post_save: invalida aquí el dashboard de los dueños
+        _bump_dashboards(set(vehicle_owners.values()))
+        return created
+
+    def with_dias_restantes(self, today=None):
+        """Anota `dias_restantes` (negativo si ya venció)"""
+        return self.annotate(dias_restantes=DaysUntil("fecha_vencimiento", today or timezone.localdate()))
+
+    def stats(self, today=None):
+        """
+        Totales del dashboard en una sola consulta: vencidos (incluye los que
+        vencen hoy), próximos (1 a 7 días) y vigentes (más de 7 días).
+        """
+        today = today or timezone.localdate()
+        week = today + timedelta(days=7)
+        return self.order_by().aggregate(
+            total=models.Count("id"),
+            vencidos=models.Count("id", filter=models.Q(fecha_vencimiento__lte=today)),
+            proximos=models.Count("id", filter=models.Q(fecha_vencimiento__gt=today, fecha_vencimiento__lte=week)),
+            vigentes=models.Count("id", filter=models.Q(fecha_vencimiento__gt=week)),
+        )
+
+    def update(self, **kwargs):
+        before = list(self.values_list("id", "vehicle__owner_id"))
+        rows = super().update(**kwargs)
+        ids = [vigencia_id for vigencia_id, _ in before]
+        owners = {owner_id for _, owner_id in before}
+        refresh = bool(self.SCHEDULE_FIELDS & kwargs.keys())
+        moved = bool({"vehicle", "vehicle_id"} & kwargs.keys())
+        # Por tramos de ids: un solo IN con todos se repetiría en cada página de refresh_next_reminder
+        for i in range(0, len(ids), self.REFRESH_CHUNK_SIZE):
+            chunk = Vigencia.objects.filter(id__in=ids[i:i + self.REFRESH_CHUNK_SIZE])
+            if refresh:
+                chunk.refresh_next_reminder()
+            if moved:
+                owners.update(chunk.values_list("vehicle__owner_id", flat=True))
+        # update() no manda post_save: invalida aquí el dashboard de los dueños de antes y de después
+        _bump_dashboards(owners)
+        return rows
+
+    def refresh_next_reminder(self, from_date=None, skip=(), batch_size=1000):
+        """Recalcula next_reminder_at por bloques con bulk_update (salvo los ids en `skip`)"""
+        from_date = from_date or timezone.localdate()
+        qs = self.order_by("id").only(
+            "id", "vehicle_id", "fecha_vencimiento", "activo", "r30", "r15", "r7", "r1",
+            "next_reminder_at", "next_reminder_offset", "updated_at",
+        ).select_related(None).prefetch_related(None).annotate(owner_id=models.F("vehicle__owner_id"))
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(qs.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return total
+            masks = owner_notification_masks({v.owner_id for v in batch})
+            now = timezone.now()
+            changed = []
+            for v in batch:
+                if v.id in skip:
+                    continue
+                before = (v.next_reminder_at, v.next_reminder_offset)
+                v.set_next_reminder(masks[v.owner_id], from_date)
+                if (v.next_reminder_at, v.next_reminder_offset) != before:
+                    v.updated_at = now
+                    changed.append(v)
+            Vigencia.objects.bulk_update(changed, ["next_reminder_at", "next_reminder_offset", "updated_at"])
+            total += len(batch)
+            last_id = batch[-1].id
+
+
 class Vigencia(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="vigencias")
     tipo = models.CharField(max_length=12, choices=VigenciaType.choices)
@@ -74,11 +253,24 @@ class Vigencia(models.Model):
     r1 = models.BooleanField(default=True)
 
     last_notified_at = models.DateTimeField(null=True, blank=True)
+    # Próximo recordatorio pendiente (y cuántos días antes del vencimiento cae),
+    # derivado de fecha_vencimiento, r30..r1 y los días de aviso del dueño
+    next_reminder_at = models.DateField(null=True, blank=True, editable=False)
+    next_reminder_offset = models.SmallIntegerField(null=True, blank=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # También cambia cuando se recalcula next_reminder_at (lo sigue run_reminder_daemon)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VigenciaQuerySet.as_manager()
 
     class Meta:
         ordering = ["fecha_vencimiento"]
+        indexes = [
+            models.Index(fields=["activo", "fecha_vencimiento"]),
+            models.Index(fields=["activo", "next_reminder_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.vehicle.alias} - {self.fecha_vencimiento}"
@@ -86,6 +278,31 @@ class Vigencia(models.Model):
     def days_left(self) -> int:
         return (self.fecha_vencimiento - timezone.localdate()).days
 
+    def save(self, *args, **kwargs):
+        profile = Profile.objects.filter(user__vehicles=self.vehicle_id).only("notification_mask").first()
+        self.set_next_reminder(profile.notification_mask if profile else None)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "next_reminder_at", "next_reminder_offset", "updated_at"}
+        super().save(*args, **kwargs)
+
+    def reminder_offsets(self, mask=None):
+        """Días antes del vencimiento en que se avisa: r30..r1 y los días del dueño (el día 0 solo por el dueño)"""
+        if mask is None:
+            mask = notification_days_mask(DEFAULT_NOTIFICATION_DAYS)
+        return tuple(
+            offset for offset in REMINDER_OFFSETS
+            if mask & (1 << offset) and (offset == 0 or getattr(self, f"r{offset}"))
+        )
+
+    def set_next_reminder(self, mask=None, from_date=None):
+        if not self.activo:
+            self.next_reminder_at = self.next_reminder_offset = None
+            return
+        self.next_reminder_at, self.next_reminder_offset = next_reminder(
+            self.fecha_vencimiento, self.reminder_offsets(mask), from_date or timezone.localdate(),
+        )
+
 
 
 class OfficialService(models.Model):
@@ -0,0 +1,67 @@
+"""
+Catálogo de servicios oficiales (OfficialService) en memoria del proceso.
+
+Cada worker guarda la lista y solo la vuelve a leer cuando cambia la versión
+compartida en el caché de Django (CACHES), que las señales de core.signals
+suben al guardar o borrar un OfficialService (también desde el admin). Como
+respaldo, si el caché no es compartido (LocMemCache), la copia en memoria se
+relee igual cada SERVICE_CATALOG_MAX_AGE_SECONDS.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from . import cache_versions
+from .models import OfficialService
+
+VERSION_KEY = "official_services:version"
+
+
+def get_version():
+    return cache_versions.get_version(VERSION_KEY)
+
+
+def bump_version():
+    """Avisa a todos los procesos que el catálogo cambió"""
+    cache_versions.bump_version(VERSION_KEY)
+
+
+class ServiceCatalog:
+    """Servicios activos ordenados, releídos de la base cuando cambia la versión o vence `max_age`"""
+
+    def __init__(self, max_age=None, clock=time.monotonic):
+        self.max_age = settings.SERVICE_CATALOG_MAX_AGE_SECONDS if max_age is None else max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._services = None
+        self._version = None
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def get(self):
+        version = get_version()
+        with self._lock:
+            now = self.clock()
+            if self._services is None or version != self._version or now - self._loaded_at >= self.max_age:
+                self._services = tuple(OfficialService.objects.filter(is_active=True).order_by("sort_order", "title"))
+                self._version = version
+                self._loaded_at = now
+                self.loads += 1
+            return self._services
+
+    def clear(self):
+        with self._lock:
+            self._services = None
+
+
+_catalog = ServiceCatalog()
+
+
+def get_official_services():
+    """Servicios oficiales activos del proceso actual"""
+    return _catalog.get()
+
+
+def clear_service_catalog():
+    _catalog.clear()
@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Profile
+from . import service_catalog
+from .dashboard_cache import bump_version
+from .models import Documento, OfficialService, Profile, Vehicle, Vigencia
 
 User = get_user_model()
 
@@ -12,4 +15,45 @@ def create_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
     instance.profile.save()
-    
\ No newline at end of file
+
+
+# Invalidación del caché del dashboard (core.dashboard_cache)
+@receiver(post_save, sender=Profile)
+def invalidate_dashboard_profile(sender, instance, created, **kwargs):
+    # save_profile guarda el perfil en cada save del User (p. ej. last_login al entrar)
+    if created or instance.dashboard_changed:
+        bump_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Profile)
+def invalidate_dashboard_profile_delete(sender, instance, **kwargs):
+    bump_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Vehicle)
+def invalidate_dashboard_vehicle(sender, instance, **kwargs):
+    bump_version(instance.owner_id)
+
+
+@receiver([post_save, post_delete], sender=Vigencia)
+def invalidate_dashboard_vigencia(sender, instance, **kwargs):
+    if Vigencia._meta.get_field("vehicle").is_cached(instance):
+        owner_id = instance.vehicle.owner_id
+    else:
+        # Si el vehículo ya se borró (cascada), su propia señal invalida al dueño
+        owner_id = Vehicle.objects.filter(id=instance.vehicle_id).values_list("owner_id", flat=True).first()
+    if owner_id:
+        bump_version(owner_id)
+
+
+@receiver([post_save, post_delete], sender=Documento)
+def invalidate_dashboard_documento(sender, instance, **kwargs):
+    owner_id = Vigencia.objects.filter(id=instance.vigencia_id).values_list("vehicle__owner_id", flat=True).first()
+    if owner_id:
+        bump_version(owner_id)
+
+
+@receiver([post_save, post_delete], sender=OfficialService)
+def invalidate_service_catalog(sender, instance, **kwargs):
+    # Después del commit: si otro worker relee antes, no debe guardar la lista vieja con la versión nueva
+    transaction.on_commit(service_catalog.bump_version)
@@ -6,6 +6,7 @@ from core.models import Vehicle, Vigencia
 from reminders.models import NotificationLog
 from datetime import date, timedelta
 from io import StringIO
+from unittest import mock
 
 class SendRemindersCommandTest(TestCase):
     def setUp(self):
@@ -82,4 +83,136 @@ class SendRemindersCommandTest(TestCase):
         # Debería estar SKIPPED
         log = NotificationLog.objects.filter(vigencia=vigencia).first()
         self.assertEqual(log.status, 'SKIPPED')
-        self.assertIn('Usuario sin email', log.message)
\ No newline at end of file
+        self.assertIn('Usuario sin email', log.message)
+
+    def test_only_candidate_dates_are_loaded(self):
+        from reminders.selection import candidate_queryset
+
+        hoy = date.today()
+        for days in (30, 15, 7, 1, 0):
+            Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=days))
+        # Fechas que nunca disparan recordatorio
+        for days in (2, 3, 20, 60, 365):
+            Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=days))
+        Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy, activo=False)
+
+        candidates = list(candidate_queryset(hoy))
+
+        self.assertEqual(len(candidates), 5)
+        self.assertEqual(
+            sorted((v.fecha_vencimiento - hoy).days for v in candidates),
+            [0, 1, 7, 15, 30],
+        )
+
+    def test_profile_notification_days_are_honored(self):
+        from reminders.selection import candidate_queryset
+
+        profile = self.user.profile
+        profile.notification_days = [15, 1]
+        profile.save()
+        self.assertEqual(profile.notification_mask, (1 << 15) | (1 << 1))
+
+        hoy = date.today()
+        for days in (30, 15, 7, 1, 0):
+            Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=days))
+
+        candidates = list(candidate_queryset(hoy))
+
+        # Sin "El día del vencimiento" marcado tampoco se avisa el día 0
+        self.assertEqual(
+            sorted((v.fecha_vencimiento - hoy).days for v in candidates),
+            [1, 15],
+        )
+
+        profile.notification_days = [15, 1, 0]
+        profile.save()
+        self.assertEqual(
+            sorted((v.fecha_vencimiento - hoy).days for v in candidate_queryset(hoy)),
+            [0, 1, 15],
+        )
+
+    def test_rebuild_next_reminders_repairs_stale_rows(self):
+        hoy = date.today()
+        vigencia = Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=7))
+        # Un UPDATE hecho por fuera del ORM deja el valor desactualizado
+        Vigencia.objects.filter(id=vigencia.id).update(next_reminder_at=None, next_reminder_offset=None)
+
+        call_command('send_reminders', stdout=StringIO())
+        self.assertEqual(NotificationLog.objects.count(), 0)
+
+        out = StringIO()
+        call_command('rebuild_next_reminders', stdout=out)
+        vigencia.refresh_from_db()
+        self.assertEqual((vigencia.next_reminder_at, vigencia.next_reminder_offset), (hoy, 7))
+        self.assertIn('1 vigencias revisadas', out.getvalue())
+
+        call_command('send_reminders', stdout=StringIO())
+        self.assertEqual(NotificationLog.objects.count(), 1)
+        vigencia.refresh_from_db()
+        # Tras el envío pasa al siguiente recordatorio
+        self.assertEqual(vigencia.next_reminder_offset, 1)
+
+    def test_simulated_days_leave_next_reminder_untouched(self):
+        hoy = date.today()
+        vigencia = Vigencia.objects.create(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=14))
+        vigencia.refresh_from_db()
+        self.assertEqual((vigencia.next_reminder_at, vigencia.next_reminder_offset), (hoy + timedelta(days=7), 7))
+
+        # Simular hoy+7: el recordatorio de 7 días sale, pero la fecha simulada no se guarda
+        call_command('send_reminders', '--days', '7', stdout=StringIO())
+        self.assertEqual(NotificationLog.objects.count(), 1)
+        vigencia.refresh_from_db()
+        self.assertEqual((vigencia.next_reminder_at, vigencia.next_reminder_offset), (hoy + timedelta(days=7), 7))
+
+
+class SendRemindersShardTest(TestCase):
+    def setUp(self):
+        for i in range(9):
+            user = User.objects.create_user(username=f'shard{i}', email=f'shard{i}@example.com')
+            vehicle = Vehicle.objects.create(owner=user, alias=f'Vehicle {i}')
+            Vigencia.objects.create(vehicle=vehicle, tipo='SOAT', fecha_vencimiento=date.today() + timedelta(days=7))
+
+    def test_shards_are_disjoint_and_cover_everyone(self):
+        per_shard = []
+        for index in range(3):
+            before = set(NotificationLog.objects.values_list('id', flat=True))
+            call_command('send_reminders', '--shard', f'{index}/3', stdout=StringIO())
+            per_shard.append(list(
+                NotificationLog.objects.exclude(id__in=before).values_list('vigencia_id', flat=True)
+            ))
+
+        all_ids = [vigencia_id for ids in per_shard for vigencia_id in ids]
+        # Ninguna vigencia sale en dos shards y entre todos cubren a todos
+        self.assertEqual(len(all_ids), len(set(all_ids)))
+        self.assertEqual(set(all_ids), set(Vigencia.objects.values_list('id', flat=True)))
+        self.assertTrue(all(per_shard))
+
+    def test_invalid_shard(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('send_reminders', '--shard', '3/3', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('send_reminders', '--shard', '0/2', '--workers', '2', stdout=StringIO())
+
+    def test_workers_split_the_run_and_sum_their_counts(self):
+        out = StringIO()
+        # Los procesos hijos escriben su resumen de shard en sys.stdout
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            call_command('send_reminders', '--workers', '3', stdout=out)
+
+        # Cada proceso manda solo su shard: los 9 salen una vez, no una vez por worker
+        self.assertIn('Listo. Enviados=9 |', out.getvalue())
+        self.assertIn('Fallidos=0', out.getvalue())
+        self.assertIn('Duplicados=0', out.getvalue())
+
+    def test_merge_counts_sums_every_key(self):
+        from reminders.management.commands.send_reminders import merge_counts
+
+        shards = [
+            {'sent': 3, 'failed': 1, 'skipped': 0},
+            {'sent': 4, 'failed': 0, 'skipped': 2},
+            {'sent': 2, 'failed': 0, 'skipped': 0, 'duplicated': 1},
+        ]
+        self.assertEqual(merge_counts(shards), {'sent': 9, 'failed': 1, 'skipped': 2, 'duplicated': 1})
+        self.assertEqual(merge_counts([]), {})
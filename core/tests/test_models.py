@@ -1,7 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
-from core.models import Vehicle, Vigencia
+from core.models import Vehicle, Vigencia, VigenciaQuerySet
 from datetime import date, timedelta
+from unittest import mock
 
 class VehicleModelTest(TestCase):
     def setUp(self):
@@ -81,4 +82,52 @@ class VigenciaModelTest(TestCase):
             activo=True
         )
         
-        self.assertEqual(vigencia.days_left(), -5)
\ No newline at end of file
+        self.assertEqual(vigencia.days_left(), -5)
+
+    def test_next_reminder_follows_flags_and_profile(self):
+        hoy = date.today()
+        vigencia = Vigencia.objects.create(
+            vehicle=self.vehicle,
+            tipo='SOAT',
+            fecha_vencimiento=hoy + timedelta(days=20),
+            r15=False,
+        )
+        # 30 días antes ya pasó y r15 está apagado: el próximo es 7 días antes
+        self.assertEqual(vigencia.next_reminder_at, hoy + timedelta(days=13))
+        self.assertEqual(vigencia.next_reminder_offset, 7)
+
+        profile = self.user.profile
+        profile.notification_days = [1]
+        profile.save()
+        vigencia.refresh_from_db()
+        self.assertEqual(vigencia.next_reminder_offset, 1)
+
+        Vigencia.objects.filter(id=vigencia.id).update(activo=False)
+        vigencia.refresh_from_db()
+        self.assertIsNone(vigencia.next_reminder_at)
+
+    def test_update_refreshes_in_id_chunks(self):
+        hoy = date.today()
+        Vigencia.objects.bulk_create([
+            Vigencia(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=40)) for _ in range(7)
+        ])
+
+        refresh = VigenciaQuerySet.refresh_next_reminder
+        with mock.patch.object(VigenciaQuerySet, 'REFRESH_CHUNK_SIZE', 3), \
+                mock.patch.object(VigenciaQuerySet, 'refresh_next_reminder', autospec=True, side_effect=refresh) as spy:
+            Vigencia.objects.filter(vehicle=self.vehicle).update(r30=False)
+
+        self.assertEqual([len(call.args[0]) for call in spy.call_args_list], [3, 3, 1])
+        self.assertEqual(set(Vigencia.objects.values_list('next_reminder_offset', flat=True)), {15})
+
+    def test_bulk_create_fills_next_reminder(self):
+        hoy = date.today()
+        Vigencia.objects.bulk_create([
+            Vigencia(vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=40)),
+            Vigencia(vehicle=self.vehicle, tipo='TECNO', fecha_vencimiento=hoy - timedelta(days=1)),
+        ])
+
+        self.assertEqual(
+            list(Vigencia.objects.order_by('tipo').values_list('next_reminder_at', 'next_reminder_offset')),
+            [(hoy + timedelta(days=10), 30), (None, None)],
+        )
@@ -1,8 +1,15 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
-from core.models import Vehicle, Vigencia
+from django.core.cache import cache
+from django.utils import timezone
+from django.test import override_settings
+from core.dashboard_cache import cache_stats
+from core.models import Documento, OfficialService, Vehicle, Vigencia
+from core.service_catalog import ServiceCatalog, get_official_services
 from datetime import date, timedelta
+import tempfile
+from unittest import mock
 
 class AuthenticationTest(TestCase):
     def setUp(self):
@@ -19,7 +26,7 @@ class AuthenticationTest(TestCase):
         self.assertTemplateUsed(response, 'core/landing.html')
     
     def test_landing_page_authenticated_redirect(self):
-        self.client.login(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
         response = self.client.get(reverse('landing'), follow=True)
         self.assertRedirects(response, reverse('dashboard'))
     
@@ -28,7 +35,7 @@ class AuthenticationTest(TestCase):
         self.assertRedirects(response, f'/accounts/login/?next={reverse("dashboard")}')
     
     def test_dashboard_authenticated(self):
-        self.client.login(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
         response = self.client.get(reverse('dashboard'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'core/dashboard.html')
@@ -40,7 +47,7 @@ class VehicleViewsTest(TestCase):
             username='testuser',
             password='testpass123'
         )
-        self.client.login(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
     
     def test_vehicle_create_get(self):
         response = self.client.get(reverse('vehicle_create'))
@@ -65,4 +72,208 @@ class VehicleViewsTest(TestCase):
         response = self.client.post(reverse('vehicle_create'), data)
         
         self.assertEqual(response.status_code, 200)  # No redirecciona
-        self.assertContains(response, "Por favor ingresa un nombre para el vehículo")
\ No newline at end of file
+        self.assertContains(response, "Por favor ingresa un nombre para el vehículo")
+
+
+class DashboardQueryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_official_services()
+        self.user = User.objects.create_user(username='flota', password='testpass123')
+        self.client.force_login(self.user)
+        hoy = timezone.localdate()
+        for i in range(3):
+            vehicle = Vehicle.objects.create(owner=self.user, alias=f'Carro {i}')
+            for dias in (-3, 0, 5, 7, 40):
+                Vigencia.objects.create(vehicle=vehicle, tipo='SOAT', fecha_vencimiento=hoy + timedelta(days=dias))
+        otro = User.objects.create_user(username='otro')
+        Vigencia.objects.create(
+            vehicle=Vehicle.objects.create(owner=otro, alias='Ajeno'), tipo='SOAT', fecha_vencimiento=hoy,
+        )
+
+    def test_stats_and_days_left_come_from_sql(self):
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_vigencias'], 15)
+        self.assertEqual(response.context['vencimientos_hoy'], 6)
+        self.assertEqual(response.context['vencimientos_proximos'], 6)
+        self.assertEqual(response.context['vigentes'], 3)
+        dias = [v.dias_restantes for v in response.context['vigencias']]
+        self.assertEqual(dias, sorted([-3, 0, 5, 7, 40] * 3))
+
+    def test_filters_do_not_change_the_stats(self):
+        response = self.client.get(reverse('dashboard'), {'estado': 'vencido'})
+
+        self.assertEqual(len(response.context['vigencias']), 3)
+        self.assertEqual(response.context['total_vigencias'], 15)
+
+    def test_query_budget_does_not_grow_with_vigencias(self):
+        with self.assertNumQueries(6):
+            self.client.get(reverse('dashboard'))
+
+        vehicle = Vehicle.objects.create(owner=self.user, alias='Otro carro')
+        Vigencia.objects.bulk_create([
+            Vigencia(vehicle=vehicle, tipo='TECNO', fecha_vencimiento=date.today() + timedelta(days=d)) for d in range(20)
+        ])
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_vigencias'], 35)
+
+
+class DashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_official_services()
+        self.user = User.objects.create_user(username='cache', password='testpass123')
+        self.client.force_login(self.user)
+        self.vehicle = Vehicle.objects.create(owner=self.user, alias='Carro')
+        self.vigencia = Vigencia.objects.create(
+            vehicle=self.vehicle, tipo='SOAT', fecha_vencimiento=timezone.localdate() + timedelta(days=10),
+        )
+
+    def get(self, **params):
+        return self.client.get(reverse('dashboard'), params)
+
+    def test_second_load_is_served_from_cache(self):
+        self.get()
+        # Solo sesión y usuario; nada de vigencias, vehículos ni servicios oficiales
+        with self.assertNumQueries(2):
+            response = self.get()
+        self.assertEqual(response.context['total_vigencias'], 1)
+        # Los filtros se aplican sobre la lista cacheada
+        with self.assertNumQueries(2):
+            response = self.get(estado='vencido')
+        self.assertEqual(len(response.context['vigencias']), 0)
+        self.assertEqual(cache_stats(), {'hits': 2, 'misses': 1})
+
+    def test_changes_invalidate_only_the_owner(self):
+        otro = User.objects.create_user(username='otro')
+        self.get()
+
+        Vehicle.objects.create(owner=otro, alias='Ajeno')
+        self.get()
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1})
+
+        self.vigencia.fecha_vencimiento = timezone.localdate() - timedelta(days=1)
+        self.vigencia.save()
+        response = self.get()
+        self.assertEqual(response.context['vencimientos_hoy'], 1)
+
+        Documento.objects.create(vigencia=self.vigencia, nombre='SOAT.pdf', archivo='documentos/soat.pdf')
+        self.get()
+        self.vehicle.delete()
+        response = self.get()
+        self.assertEqual(response.context['total_vigencias'], 0)
+
+        self.user.profile.plan = 'PRO'
+        self.user.profile.save()
+        response = self.get()
+        self.assertFalse(response.context['is_free'])
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 5})
+
+    def test_bulk_changes_invalidate_the_owners(self):
+        otro = User.objects.create_user(username='otro')
+        ajeno = Vehicle.objects.create(owner=otro, alias='Ajeno')
+        self.get()
+
+        # Ni update() ni bulk_create() mandan post_save
+        Vigencia.objects.filter(id=self.vigencia.id).update(activo=False)
+        response = self.get()
+        self.assertEqual(response.context['total_vigencias'], 0)
+
+        Vigencia.objects.bulk_create([
+            Vigencia(vehicle=self.vehicle, tipo='TECNO', fecha_vencimiento=timezone.localdate() + timedelta(days=3)),
+        ])
+        response = self.get()
+        self.assertEqual(response.context['total_vigencias'], 1)
+
+        # Al pasar la vigencia a otro vehículo cambian el dueño de antes y el de después
+        Vigencia.objects.filter(vehicle=self.vehicle).update(vehicle=ajeno)
+        response = self.get()
+        self.assertEqual(response.context['total_vigencias'], 0)
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 4})
+
+    def test_login_keeps_the_cached_dashboard(self):
+        self.get()
+        # Cada login guarda el User (last_login) y save_profile guarda su Profile
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.user.profile.phone = '+573001112233'
+        self.user.profile.save()
+        self.get()
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_rolls_over_at_local_midnight(self):
+        self.get()
+        tomorrow = timezone.localtime() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            response = self.get()
+
+        self.assertEqual([v.dias_restantes for v in response.context['vigencias']], [9])
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 2})
+
+
+class ServiceCatalogTest(TestCase):
+    def setUp(self):
+        # Caché en archivos: compartido entre procesos como lo sería Redis o Memcached
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmp.name},
+        }))
+        # Reemplaza los servicios que siembra la migración
+        OfficialService.objects.all().delete()
+        self.simit = OfficialService.objects.create(key='simit', title='SIMIT', url='https://simit.example.com', sort_order=2)
+        OfficialService.objects.create(key='runt', title='RUNT', url='https://runt.example.com', sort_order=1)
+        OfficialService.objects.create(key='viejo', title='Viejo', url='https://old.example.com', is_active=False)
+
+    def test_workers_reread_only_after_a_change(self):
+        worker_a, worker_b = ServiceCatalog(), ServiceCatalog()
+        with self.assertNumQueries(1):
+            self.assertEqual([s.key for s in worker_a.get()], ['runt', 'simit'])
+        with self.assertNumQueries(0):
+            worker_a.get()
+        worker_b.get()
+
+        # Un cambio desde otro proceso (p. ej. el admin) solo sube la versión compartida
+        with self.captureOnCommitCallbacks(execute=True):
+            self.simit.title = 'SIMIT multas'
+            self.simit.save()
+        self.assertEqual(worker_a.get()[1].title, 'SIMIT multas')
+        self.assertEqual(worker_b.get()[1].title, 'SIMIT multas')
+        self.assertEqual((worker_a.loads, worker_b.loads), (2, 2))
+
+        # El borrado masivo del admin también manda post_delete por fila
+        with self.captureOnCommitCallbacks(execute=True):
+            OfficialService.objects.filter(key='runt').delete()
+        self.assertEqual([s.key for s in worker_b.get()], ['simit'])
+
+    def test_version_is_bumped_only_after_commit(self):
+        worker = ServiceCatalog()
+        worker.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            OfficialService.objects.create(key='pico', title='Pico y placa', url='https://pico.example.com')
+            with self.assertNumQueries(0):
+                worker.get()
+        self.assertEqual(len(callbacks), 1)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_unshared_cache_still_rereads_after_max_age(self):
+        now = [0.0]
+        worker = ServiceCatalog(max_age=300, clock=lambda: now[0])
+        worker.get()
+        # Un cambio cuya versión no le llega a este worker (se subió en el caché de otro proceso)
+        OfficialService.objects.filter(key='simit').update(title='SIMIT multas')
+
+        now[0] = 299
+        self.assertEqual(worker.get()[1].title, 'SIMIT')
+        now[0] = 300
+        self.assertEqual(worker.get()[1].title, 'SIMIT multas')
+
+    def test_lost_version_forces_a_reload(self):
+        worker = ServiceCatalog()
+        worker.get()
+        cache.clear()
+        worker.get()
+        self.assertEqual(worker.loads, 2)
@@ -12,8 +12,9 @@ from datetime import datetime, timedelta
 from .validators import validar_placa_colombiana
 from .forms import VigenciaFilterForm
 from .forms import ProfileForm
-from core.models import OfficialService
 from .models import Documento
+from .dashboard_cache import get_dashboard_data
+from .service_catalog import get_official_services
 
 
 from .models import Vehicle, Vigencia, PlanChoices
@@ -27,59 +28,41 @@ def landing(request):
 
 @login_required
 def dashboard(request):
-    # Obtener todos los vehículos del usuario
-    vehicles = Vehicle.objects.filter(owner=request.user)
-    
-    # Inicializar queryset
-    vigencias = Vigencia.objects.filter(
-        vehicle__owner=request.user, 
-        activo=True
-    ).select_related('vehicle')
+    hoy = timezone.localdate()
+    # Vehículos, vigencias activas (con días restantes) y estadísticas, del caché por usuario
+    data = get_dashboard_data(request.user, hoy)
+    vehicles = data["vehicles"]
+    vigencias = data["vigencias"]
+    # Estadísticas de todas las vigencias activas (los filtros solo afectan la tabla)
+    stats = data["stats"]
+    total_vigencias = stats["total"]
     
     # Formulario de filtros
     filter_form = VigenciaFilterForm(request.GET or None, user_vehicles=vehicles)
     # Obtener servicios oficiales activos
-    official_services = OfficialService.objects.filter(is_active=True).order_by("sort_order", "title")
-    # Aplicar filtros
+    official_services = get_official_services()
+    # Aplicar filtros (sobre la lista ya ordenada por fecha de vencimiento)
     if filter_form.is_valid():
         tipo = filter_form.cleaned_data.get('tipo')
         estado = filter_form.cleaned_data.get('estado')
         vehicle_id = filter_form.cleaned_data.get('vehicle')
         
-        hoy = timezone.localdate()
-        
         if tipo:
-            vigencias = vigencias.filter(tipo=tipo)
+            vigencias = [v for v in vigencias if v.tipo == tipo]
         
         if estado:
             if estado == 'vencido':
-                vigencias = vigencias.filter(fecha_vencimiento__lt=hoy)
+                vigencias = [v for v in vigencias if v.dias_restantes < 0]
             elif estado == 'proximo':
-                vigencias = vigencias.filter(
-                    fecha_vencimiento__range=[hoy, hoy + timedelta(days=7)]
-                )
+                vigencias = [v for v in vigencias if 0 <= v.dias_restantes <= 7]
             elif estado == 'vigente':
-                vigencias = vigencias.filter(fecha_vencimiento__gt=hoy + timedelta(days=7))
+                vigencias = [v for v in vigencias if v.dias_restantes > 7]
         
         if vehicle_id:
-            vigencias = vigencias.filter(vehicle_id=vehicle_id)
-    
-    # Ordenar por fecha de vencimiento
-    vigencias = vigencias.order_by('fecha_vencimiento')
-    
-    # Calcular días restantes
-    hoy = timezone.localdate()
-    for v in vigencias:
-        v.dias_restantes = (v.fecha_vencimiento - hoy).days
-    
-    # Estadísticas
-    total_vigencias = vigencias.count()
-    vencimientos_proximos = sum(1 for v in vigencias if 0 < v.dias_restantes <= 7)
-    vencimientos_hoy = sum(1 for v in vigencias if v.dias_restantes <= 0)
+            vigencias = [v for v in vigencias if str(v.vehicle_id) == vehicle_id]
     
     # Plan del usuario
-    profile = getattr(request.user, "profile", None)
-    plan = profile.plan if profile else PlanChoices.FREE
+    plan = data["plan"]
     is_free = plan == PlanChoices.FREE
     
     # Límite de vigencias para free
@@ -92,8 +75,9 @@ def dashboard(request):
         "plan": plan,
         "is_free": is_free,
         "total_vigencias": total_vigencias,
-        "vencimientos_proximos": vencimientos_proximos,
-        "vencimientos_hoy": vencimientos_hoy,
+        "vencimientos_proximos": stats["proximos"],
+        "vencimientos_hoy": stats["vencidos"],
+        "vigentes": stats["vigentes"],
         "porcentaje_uso": porcentaje_uso,
         "limite_free": limite_free,
         "today": hoy,
@@ -12,48 +12,18 @@ class WhatsAppService:
         )
         self.from_number = f"whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}"
     
+    @staticmethod
+    def build_reminder_message(vigencia, days_left):
+        """Texto del recordatorio (plantilla aprobada por WhatsApp, editable en ReminderTemplate)"""
+        from reminders.message_templates import get_templates
+        from reminders.models import ChannelChoices
+
+        return get_templates().render(ChannelChoices.WHATSAPP, vigencia, days_left)[1]
+
     def send_reminder(self, to_phone, vigencia, days_left):
         """Envía recordatorio por WhatsApp"""
         try:
-            vehicle = vigencia.vehicle
-            tipo = vigencia.get_tipo_display()
-            
-            # Plantilla aprobada por WhatsApp
-            if days_left == 0:
-                message = f"""
-*🚨 URGENTE: {tipo} VENCE HOY*
-
-📋 Documento: {tipo}
-🚗 Vehículo: {vehicle.alias}
-📅 Fecha vencimiento: HOY
-🔗 Renueva aquí: {settings.BASE_URL}
-
-_Mis Vigencias - Recordatorios automáticos_
-"""
-            elif days_left <= 7:
-                message = f"""
-*⚠️ Recordatorio: {tipo} por vencer*
-
-📋 Documento: {tipo}
-🚗 Vehículo: {vehicle.alias}
-📅 Vence en: {days_left} días
-🗓️ Fecha: {vigencia.fecha_vencimiento}
-🔗 Ver detalles: {settings.BASE_URL}
-
-_Mis Vigencias - Recordatorios automáticos_
-"""
-            else:
-                message = f"""
-*📅 Recordatorio: {tipo}*
-
-📋 Documento: {tipo}
-🚗 Vehículo: {vehicle.alias}
-📅 Vence en: {days_left} días
-🗓️ Fecha: {vigencia.fecha_vencimiento}
-🔗 Ver detalles: {settings.BASE_URL}
-
-_Mis Vigencias - Recordatorios automáticos_
-"""
+            message = self.build_reminder_message(vigencia, days_left)
             
             # Enviar mensaje
             response = self.client.messages.create(
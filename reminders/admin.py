@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import NotificationLog
+from .models import NotificationLog, OutboxMessage, ReminderDelivery, ReminderTemplate
 
 
 @admin.register(NotificationLog)
@@ -9,4 +9,30 @@ class NotificationLogAdmin(admin.ModelAdmin):
     search_fields = ("vigencia__vehicle__alias", "vigencia__vehicle__plate")
     date_hierarchy = "created_at"   
     ordering = ("-created_at",)
-    
\ No newline at end of file
+    
+
+@admin.register(ReminderDelivery)
+class ReminderDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("vigencia", "channel", "offset_day", "target_date", "status", "sent_at")
+    list_filter = ("channel", "status", "target_date")
+    search_fields = ("vigencia__vehicle__alias", "vigencia__vehicle__plate", "run_id")
+    date_hierarchy = "target_date"
+    ordering = ("-target_date",)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("vigencia", "channel", "recipient", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("channel", "status", "target_date")
+    search_fields = ("recipient", "locked_by", "run_id")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+
+
+@admin.register(ReminderTemplate)
+class ReminderTemplateAdmin(admin.ModelAdmin):
+    list_display = ("channel", "tipo", "days_bucket", "locale", "subject", "is_active", "updated_at")
+    list_filter = ("channel", "tipo", "days_bucket", "locale", "is_active")
+    list_editable = ("is_active",)
+    search_fields = ("subject", "body")
+    ordering = ("channel", "tipo", "days_bucket")
@@ -0,0 +1,131 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from core.models import FCMToken
+from reminders.dispatcher import DeliveryResult
+from reminders.email_channel import EmailBatchSender
+from reminders.models import ChannelChoices
+
+logger = logging.getLogger(__name__)
+
+
+class EmailChannel:
+    """Cada lote sale por una conexión SMTP propia del hilo que lo envía"""
+    channel = ChannelChoices.EMAIL
+
+    def __init__(self, concurrency, batch_size=None):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size or settings.REMINDERS_EMAIL_BATCH_SIZE)
+
+    def send_batch(self, batch):
+        emails = [EmailMessage(subject=m.subject, body=m.body, to=[m.recipient]) for m in batch]
+        sender = EmailBatchSender(self.batch_size)
+        return [
+            DeliveryResult(message, error=error,
+                           detail=f"Email enviado a {message.recipient} (days_left={message.days_left})")
+            for message, (_, error) in zip(batch, sender.send(emails))
+        ]
+
+
+class WhatsAppChannel:
+    """
+    WhatsApp vía la API de Twilio con el envío asíncrono y limitado de
+    reminders.whatsapp_async, o simulado si WHATSAPP_ENABLED=False.
+    """
+    channel = ChannelChoices.WHATSAPP
+
+    def __init__(self, concurrency, batch_size=None):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size or settings.REMINDERS_WHATSAPP_BATCH_SIZE)
+        self.simulated = not settings.WHATSAPP_ENABLED
+        self.sender = None
+        if not self.simulated:
+            from reminders.whatsapp_async import AsyncWhatsAppSender
+            # Un solo sender (y un solo token bucket) compartido por todos los hilos del canal
+            self.sender = AsyncWhatsAppSender()
+
+    def send_batch(self, batch):
+        if self.simulated:
+            return [DeliveryResult(m, detail=f"WhatsApp simulado a {m.recipient}") for m in batch]
+        return self.sender.send(batch)
+
+
+class PushChannel:
+    """
+    Push por Firebase (core.firebase_service) a los tokens activos del dueño.
+
+    Cada recordatorio se reparte a todos los tokens de su dueño y los mensajes
+    del lote salen juntos en llamadas de hasta 500 (send_each), no una llamada
+    por recordatorio. Los tokens que FCM da por muertos vuelven en
+    DeliveryResult.dead_tokens para desactivarlos desde el hilo principal.
+    """
+    channel = ChannelChoices.PUSH
+
+    def __init__(self, concurrency, batch_size=None):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size or settings.REMINDERS_PUSH_BATCH_SIZE)
+        self._service = None
+
+    @property
+    def service(self):
+        if self._service is None:
+            from core.firebase_service import FirebaseService
+            self._service = FirebaseService()
+        return self._service
+
+    def send_batch(self, batch):
+        owners = []
+        notifications = []
+        for index, message in enumerate(batch):
+            data = {"vigencia_id": str(message.vigencia.pk)}
+            for token in message.tokens:
+                owners.append((index, token))
+                notifications.append(self.service.build_message(token, message.subject, message.body, data))
+
+        sent = [0] * len(batch)
+        errors = [None] * len(batch)
+        dead = [[] for _ in batch]
+        for (index, token), response in zip(owners, self.service.send_each(notifications)):
+            if response.success:
+                sent[index] += 1
+            else:
+                errors[index] = response.exception
+                if self.service.is_dead_token(response.exception):
+                    dead[index].append(token)
+
+        results = []
+        for index, message in enumerate(batch):
+            if sent[index]:
+                results.append(DeliveryResult(
+                    message,
+                    detail=f"Push enviado a {sent[index]}/{len(message.tokens)} dispositivos",
+                    dead_tokens=tuple(dead[index]),
+                ))
+            else:
+                error = errors[index] or RuntimeError("Sin tokens activos")
+                results.append(DeliveryResult(message, error=RuntimeError(str(error)), dead_tokens=tuple(dead[index])))
+        return results
+
+
+def deactivate_tokens(tokens):
+    """Desactiva en un solo UPDATE los tokens que FCM reportó como muertos"""
+    if not tokens:
+        return 0
+    return FCMToken.objects.filter(token__in=tokens, is_active=True).update(is_active=False)
+
+
+def build_channels(email_workers=None, whatsapp_workers=None, push_workers=None, email_batch_size=None):
+    """Canales habilitados con su concurrencia (por defecto REMINDERS_*_WORKERS)"""
+    channels = {
+        ChannelChoices.EMAIL: EmailChannel(
+            email_workers or settings.REMINDERS_EMAIL_WORKERS, email_batch_size,
+        ),
+        ChannelChoices.WHATSAPP: WhatsAppChannel(
+            whatsapp_workers or settings.REMINDERS_WHATSAPP_WORKERS,
+        ),
+    }
+    if settings.FIREBASE_CREDENTIALS or settings.FIREBASE_MESSAGING_BACKEND:
+        channels[ChannelChoices.PUSH] = PushChannel(push_workers or settings.REMINDERS_PUSH_WORKERS)
+    return channels
@@ -0,0 +1,60 @@
+from collections import deque
+
+from reminders.models import ReminderCheckpoint
+
+
+class RunCheckpoint:
+    """
+    Guarda en ReminderCheckpoint la última vigencia cuyo envío ya se registró.
+
+    Los bloques se despachan en orden pero sus resultados llegan desordenados:
+    la posición solo avanza hasta el primer bloque que aún tiene mensajes en
+    curso, así un --resume nunca salta vigencias que no se llegaron a enviar.
+    """
+
+    def __init__(self, target_date, shard=None, resume=False):
+        label = f"{shard[0]}/{shard[1]}" if shard else ""
+        self.row, _ = ReminderCheckpoint.objects.get_or_create(target_date=target_date, shard=label)
+        if not resume:
+            self.row.last_owner_id = self.row.last_id = 0
+            self.row.finished = False
+            self.row.save()
+        self._chunks = deque()
+        self._chunk_of = {}
+
+    @property
+    def position(self):
+        return (self.row.last_owner_id, self.row.last_id)
+
+    @property
+    def finished(self):
+        return self.row.finished
+
+    def track(self, key, messages):
+        """Registra un bloque despachado: `key` es su última (owner_id, id)"""
+        chunk = [key, len(messages)]
+        self._chunks.append(chunk)
+        for message in messages:
+            self._chunk_of[id(message)] = chunk
+
+    def done(self, message):
+        chunk = self._chunk_of.pop(id(message), None)
+        if chunk is not None:
+            chunk[1] -= 1
+
+    def advance(self):
+        """Descarta los bloques ya completos; True si la posición cambió"""
+        key = None
+        while self._chunks and self._chunks[0][1] <= 0:
+            key = self._chunks.popleft()[0]
+        if key is None:
+            return False
+        self.row.last_owner_id, self.row.last_id = key
+        return True
+
+    def save(self):
+        self.row.save(update_fields=["last_owner_id", "last_id", "updated_at"])
+
+    def finish(self):
+        self.row.finished = True
+        self.row.save(update_fields=["finished", "updated_at"])
@@ -0,0 +1,51 @@
+from reminders.dispatcher import ReminderMessage
+from reminders.models import ChannelChoices
+
+
+def build_digests(messages):
+    """
+    Agrupa los emails por dueño: un solo mensaje con todas sus vigencias.
+
+    El mensaje resultante lleva los originales en `items`, así cada vigencia
+    conserva su propio NotificationLog y su entrada en el ledger. Los demás
+    canales y los dueños con una sola vigencia quedan igual.
+    """
+    by_owner = {}
+    result = []
+    for message in messages:
+        if message.channel != ChannelChoices.EMAIL:
+            result.append(message)
+            continue
+        by_owner.setdefault(message.vigencia.vehicle.owner_id, []).append(message)
+
+    for items in by_owner.values():
+        items.sort(key=lambda m: m.vigencia.fecha_vencimiento)
+        if len(items) == 1:
+            result.append(items[0])
+            continue
+        result.append(ReminderMessage(
+            vigencia=items[0].vigencia,
+            channel=ChannelChoices.EMAIL,
+            recipient=items[0].recipient,
+            days_left=min(m.days_left for m in items),
+            subject=f"[Mis Vigencias] {len(items)} vigencias por vencer",
+            body=render_digest_body(items),
+            items=tuple(items),
+        ))
+    return result
+
+
+def render_digest_body(items):
+    owner = items[0].vigencia.vehicle.owner
+    lines = [
+        f"Hola {owner.username},\n",
+        "Estas vigencias de tus vehículos están por vencer:\n",
+    ]
+    for message in sorted(items, key=lambda m: (m.days_left, m.vigencia.vehicle.alias)):
+        v = message.vigencia
+        vehicle = f"{v.vehicle.alias} ({v.vehicle.plate})" if v.vehicle.plate else v.vehicle.alias
+        days = "vence HOY" if message.days_left == 0 else f"{message.days_left} día(s)"
+        lines.append(f"- {v.get_tipo_display()} · {vehicle}: vence el {v.fecha_vencimiento} ({days})")
+    lines.append("\nSi ya renovaste, entra al dashboard y márcalo como 'Renové'.\n")
+    lines.append("— Mis Vigencias")
+    return "\n".join(lines)
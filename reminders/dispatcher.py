@@ -0,0 +1,120 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from reminders.fair import FairQueue
+
+
+@dataclass
+class ReminderMessage:
+    """Un recordatorio ya decidido, listo para enviarse por un canal"""
+    vigencia: object
+    channel: str
+    recipient: str
+    days_left: int
+    subject: str = ""
+    body: str = ""
+    tokens: tuple = field(default_factory=tuple)
+    # Mensajes individuales que este mensaje agrupa (modo --digest)
+    items: tuple = field(default_factory=tuple)
+    # Fila de OutboxMessage de la que viene (drain_outbox)
+    outbox_id: int = None
+
+
+@dataclass
+class DeliveryResult:
+    message: ReminderMessage
+    error: Exception = None
+    detail: str = ""
+    # Tokens FCM que el proveedor reportó como inválidos (canal push)
+    dead_tokens: tuple = field(default_factory=tuple)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ReminderDispatcher:
+    """
+    Envía ReminderMessage en paralelo, con un pool de hilos acotado por canal.
+
+    Cada canal recibe lotes de `batch_size` mensajes y tiene como máximo
+    `concurrency` lotes en curso (más otros tantos en cola); si se llena,
+    `submit` bloquea. Así un proveedor lento solo frena su propio canal.
+
+    Los hilos no tocan la base de datos: los resultados se recogen con `poll()`
+    y `close()` desde el hilo principal, que es quien escribe los logs.
+
+    Los lotes no salen en orden de llegada: cada canal tiene una FairQueue que
+    reparte entre clientes (flotas de Empresa y usuarios individuales), y con
+    `buffer_size` se acumulan hasta esa cantidad de mensajes antes de armar un
+    lote, para que una flota grande no ocupe todos los lotes seguidos.
+
+    Con `metrics` (reminders.metrics.RunMetrics) se anota la cola, la duración
+    de cada send_batch y la latencia de cada mensaje (cola + envío), por canal
+    y por clase de cliente.
+    """
+
+    def __init__(self, channels, metrics=None, buffer_size=None):
+        self.channels = channels
+        self.metrics = metrics
+        self.buffer_size = buffer_size or 0
+        self._pools = {}
+        self._slots = {}
+        self._pending = {}
+        self._results = queue.SimpleQueue()
+        for name, channel in channels.items():
+            self._pools[name] = ThreadPoolExecutor(
+                max_workers=channel.concurrency,
+                thread_name_prefix=f"reminders-{name.lower()}",
+            )
+            self._slots[name] = threading.BoundedSemaphore(channel.concurrency * 2)
+            self._pending[name] = FairQueue()
+
+    def submit(self, message):
+        pending = self._pending[message.channel]
+        pending.push(message, time.perf_counter())
+        if self.metrics is not None:
+            self.metrics.queued(message.channel)
+        if len(pending) >= max(self.channels[message.channel].batch_size, self.buffer_size):
+            self._submit_batch(message.channel)
+
+    def poll(self):
+        """Resultados ya terminados, sin bloquear"""
+        while True:
+            try:
+                yield self._results.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        """Envía los lotes incompletos, espera a todos los canales y entrega lo que falte"""
+        for name in self.channels:
+            while self._pending[name]:
+                self._submit_batch(name)
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        yield from self.poll()
+
+    def _submit_batch(self, name):
+        entries = self._pending[name].pop_batch(self.channels[name].batch_size)
+        self._slots[name].acquire()
+        self._pools[name].submit(self._run, name, entries)
+
+    def _run(self, name, entries):
+        batch = [message for message, _, _ in entries]
+        start = time.perf_counter()
+        try:
+            results = self.channels[name].send_batch(batch)
+        except Exception as e:
+            results = [DeliveryResult(message, error=e) for message in batch]
+        finally:
+            self._slots[name].release()
+        if self.metrics is not None:
+            end = time.perf_counter()
+            self.metrics.observe_batch(name, end - start, results)
+            self.metrics.observe_messages(name, ((tenant, end - queued_at) for _, queued_at, tenant in entries))
+        for result in results:
+            self._results.put(result)
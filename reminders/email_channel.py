@@ -0,0 +1,90 @@
+import logging
+import smtplib
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Errores que indican que la conexión se cayó (se reconecta para el siguiente mensaje)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class EmailBatchSender:
+    """
+    Envía EmailMessage reutilizando una sola conexión del backend de email.
+
+    La conexión se abre una vez por lote (`batch_size` mensajes) en lugar de una
+    vez por mensaje, así el handshake TLS se paga por lote. Cada mensaje se envía
+    por separado sobre esa conexión para poder registrar su resultado: el backend
+    SMTP aborta un send_messages completo en el primer error sin decir cuáles ya
+    salieron. Si la conexión se cae durante un mensaje, ese mensaje se da por
+    fallido (el servidor pudo haber aceptado su DATA, así que reenviarlo en la
+    misma pasada podría duplicarlo; queda para el reintento del outbox) y se
+    reconecta para el siguiente, hasta `max_reconnects` veces por lote. Si no se
+    puede reabrir, el resto del lote se da por fallido sin más intentos.
+    """
+
+    def __init__(self, batch_size=None, backend=None, max_reconnects=2, **connection_kwargs):
+        self.batch_size = max(1, batch_size or settings.REMINDERS_EMAIL_BATCH_SIZE)
+        self.backend = backend
+        self.connection_kwargs = connection_kwargs
+        self.max_reconnects = max_reconnects
+        self.connections_opened = 0
+
+    def send(self, messages):
+        """Envía los mensajes y retorna [(mensaje, error o None)] en el mismo orden"""
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            results.extend(self._send_batch(batch))
+        return results
+
+    def _send_batch(self, batch):
+        results = []
+        connection = None
+        drops = 0
+        try:
+            for index, message in enumerate(batch):
+                if connection is None:
+                    if drops > self.max_reconnects:
+                        # Se agotaron las reconexiones: el resto del lote tampoco saldría
+                        results.extend((pending, error) for pending in batch[index:])
+                        return results
+                    try:
+                        connection = self._open()
+                    except Exception as e:
+                        # Servidor caído: no se reintenta mensaje por mensaje
+                        logger.warning(f"No se pudo conectar al servidor de email, lote fallido: {e}")
+                        results.extend((pending, e) for pending in batch[index:])
+                        return results
+                error = None
+                try:
+                    connection.send_messages([message])
+                except CONNECTION_ERRORS as e:
+                    # No se reenvía: no se sabe si el servidor alcanzó a aceptarlo
+                    error = e
+                    drops += 1
+                    logger.warning(f"Conexión de email perdida, el mensaje queda fallido: {e}")
+                    self._close(connection)
+                    connection = None
+                except Exception as e:
+                    error = e
+                results.append((message, error))
+        finally:
+            self._close(connection)
+        return results
+
+    def _open(self):
+        connection = get_connection(backend=self.backend, fail_silently=False, **self.connection_kwargs)
+        connection.open()
+        self.connections_opened += 1
+        return connection
+
+    def _close(self, connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
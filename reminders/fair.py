@@ -0,0 +1,90 @@
+from collections import Counter, OrderedDict, deque
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+# Clases de cliente: cuentas de empresa (flotas) y usuarios individuales
+TENANT_EMPRESA = "empresa"
+TENANT_INDIVIDUAL = "individual"
+
+
+def tenant_of(message):
+    """
+    (clase, id) del cliente al que pertenece un mensaje: la empresa del dueño
+    si es usuario activo de una, si no el propio dueño.
+    """
+    if message.vigencia is None or message.vigencia.vehicle_id is None:
+        return (TENANT_INDIVIDUAL, None)
+    owner = message.vigencia.vehicle.owner
+    try:
+        membership = owner.usuarioempresa
+    except ObjectDoesNotExist:
+        membership = None
+    if membership is not None and membership.activo:
+        return (TENANT_EMPRESA, membership.empresa_id)
+    return (TENANT_INDIVIDUAL, owner.pk)
+
+
+def parse_weights(value):
+    """'empresa=4,individual=1' -> {'empresa': 4, 'individual': 1}"""
+    weights = {}
+    for part in value.split(","):
+        if part.strip():
+            name, _, weight = part.partition("=")
+            weights[name.strip()] = int(weight)
+    return weights
+
+
+class FairQueue:
+    """
+    Cola por cliente con round-robin ponderado.
+
+    Cada vuelta le da a un cliente tantos mensajes como el peso de su clase
+    (REMINDERS_TENANT_WEIGHTS) y, mientras haya otros esperando, ninguno pasa
+    de REMINDERS_TENANT_QUOTA mensajes por lote. Si solo queda uno, se lleva
+    el lote entero: la cuota no deja capacidad ociosa. Dentro de un cliente
+    el orden es FIFO, y la ronda sigue entre lotes donde quedó.
+    """
+
+    def __init__(self, weights=None, quota=None):
+        self.weights = weights or parse_weights(settings.REMINDERS_TENANT_WEIGHTS)
+        self.quota = max(1, quota or settings.REMINDERS_TENANT_QUOTA)
+        self._queues = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, message, queued_at):
+        tenant = tenant_of(message)
+        self._queues.setdefault(tenant, deque()).append((message, queued_at, tenant[0]))
+        self._size += 1
+
+    def pop_batch(self, size):
+        """Hasta `size` entradas (mensaje, hora de encolado, clase de cliente)"""
+        batch = []
+        taken = Counter()
+        capped = True
+        while len(batch) < size and self._queues:
+            progressed = False
+            for tenant in list(self._queues):
+                if len(batch) >= size:
+                    break
+                queue = self._queues[tenant]
+                turn = max(1, self.weights.get(tenant[0], 1))
+                if capped and len(self._queues) > 1:
+                    turn = min(turn, self.quota - taken[tenant])
+                turn = min(turn, size - len(batch), len(queue))
+                for _ in range(turn):
+                    batch.append(queue.popleft())
+                taken[tenant] += turn
+                progressed = progressed or turn > 0
+                if queue:
+                    self._queues.move_to_end(tenant)
+                else:
+                    del self._queues[tenant]
+            if not progressed:
+                # Todos los que quedan llegaron a su cuota: el resto del lote se reparte sin tope
+                capped = False
+        self._size -= len(batch)
+        return batch
@@ -0,0 +1,117 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import Vigencia
+from reminders.models import DeliveryStatus, ReminderDelivery
+
+
+class DeliveryLedger:
+    """
+    Reclama entregas en ReminderDelivery antes de enviarlas.
+
+    La restricción única (vigencia, channel, offset_day, target_date) hace que
+    solo una corrida gane cada entrega: se insertan los reclamos con
+    bulk_create(ignore_conflicts=True) y luego se leen los que quedaron con el
+    run_id propio. Un envío fallido libera su reclamo para que un reintento lo
+    tome; un reclamo que quedó colgado (corrida caída) se puede robar pasados
+    REMINDERS_CLAIM_STALE_MINUTES.
+    """
+
+    def __init__(self, target_date, stale_after=None, run_id=None):
+        self.target_date = target_date
+        self.run_id = run_id or uuid.uuid4().hex
+        minutes = settings.REMINDERS_CLAIM_STALE_MINUTES if stale_after is None else stale_after
+        self.stale_after = timedelta(minutes=minutes)
+
+    def _key(self, message):
+        return (message.vigencia.pk, message.channel, message.days_left)
+
+    def claim(self, messages):
+        """Retorna (reclamados, ya_tomados): solo los reclamados se deben enviar"""
+        if not messages:
+            return [], []
+
+        existing = {
+            (d.vigencia_id, d.channel, d.offset_day): d
+            for d in ReminderDelivery.objects.filter(
+                target_date=self.target_date,
+                vigencia_id__in={m.vigencia.pk for m in messages},
+            ).only("id", "vigencia_id", "channel", "offset_day", "status", "claimed_at", "run_id")
+        }
+
+        now = timezone.now()
+        stale_cutoff = now - self.stale_after
+        new_rows = []
+        stale_ids = []
+        for message in messages:
+            delivery = existing.get(self._key(message))
+            if delivery is None:
+                new_rows.append(ReminderDelivery(
+                    vigencia=message.vigencia,
+                    channel=message.channel,
+                    offset_day=message.days_left,
+                    target_date=self.target_date,
+                    run_id=self.run_id,
+                    claimed_at=now,
+                ))
+            elif delivery.status == DeliveryStatus.CLAIMED and delivery.claimed_at < stale_cutoff:
+                stale_ids.append(delivery.id)
+
+        if new_rows:
+            ReminderDelivery.objects.bulk_create(new_rows, ignore_conflicts=True)
+        if stale_ids:
+            # El UPDATE condicionado es atómico: si otra corrida lo robó primero, no cambia nada
+            ReminderDelivery.objects.filter(
+                id__in=stale_ids,
+                status=DeliveryStatus.CLAIMED,
+                claimed_at__lt=stale_cutoff,
+            ).update(run_id=self.run_id, claimed_at=now)
+
+        owned = set(
+            ReminderDelivery.objects.filter(
+                run_id=self.run_id,
+                target_date=self.target_date,
+                vigencia_id__in={m.vigencia.pk for m in messages},
+            ).values_list("vigencia_id", "channel", "offset_day")
+        )
+        claimed = [m for m in messages if self._key(m) in owned]
+        taken = [m for m in messages if self._key(m) not in owned]
+        return claimed, taken
+
+    def confirm(self, messages):
+        """Marca como enviadas y actualiza Vigencia.last_notified_at"""
+        if not messages:
+            return
+        now = timezone.now()
+        vigencia_ids = {m.vigencia.pk for m in messages}
+        for channel in {m.channel for m in messages}:
+            ReminderDelivery.objects.filter(
+                run_id=self.run_id,
+                channel=channel,
+                vigencia_id__in={m.vigencia.pk for m in messages if m.channel == channel},
+            ).update(status=DeliveryStatus.SENT, sent_at=now)
+        Vigencia.objects.filter(id__in=vigencia_ids).update(last_notified_at=now)
+
+    def mark_queued(self, messages):
+        """Los reclamos ya guardados en el outbox no se consideran colgados"""
+        for channel in {m.channel for m in messages}:
+            ReminderDelivery.objects.filter(
+                run_id=self.run_id,
+                channel=channel,
+                vigencia_id__in={m.vigencia.pk for m in messages if m.channel == channel},
+                status=DeliveryStatus.CLAIMED,
+            ).update(status=DeliveryStatus.QUEUED)
+
+    def release(self, messages):
+        """Libera los reclamos de envíos fallidos para que otra corrida los reintente"""
+        for message in messages:
+            ReminderDelivery.objects.filter(
+                run_id=self.run_id,
+                vigencia_id=message.vigencia.pk,
+                channel=message.channel,
+                offset_day=message.days_left,
+                status__in=[DeliveryStatus.CLAIMED, DeliveryStatus.QUEUED],
+            ).delete()
@@ -0,0 +1,41 @@
+from django.conf import settings
+
+from reminders.models import NotificationLog
+
+
+class NotificationLogWriter:
+    """
+    Acumula NotificationLog en memoria y los inserta con bulk_create por bloques.
+
+    Se vacía al llenar cada bloque y al salir del `with`, incluso si hubo una
+    excepción: ante una caída se pierde como máximo un bloque.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = max(1, chunk_size or settings.REMINDERS_LOG_CHUNK_SIZE)
+        self.written = 0
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def add(self, vigencia, channel, status, message=""):
+        self._buffer.append(NotificationLog(
+            vigencia=vigencia,
+            channel=channel,
+            status=status,
+            message=message[:255],
+        ))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        NotificationLog.objects.bulk_create(self._buffer, batch_size=self.chunk_size)
+        self.written += len(self._buffer)
+        self._buffer = []
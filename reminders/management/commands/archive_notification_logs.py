@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from reminders.models import NotificationLog
+
+FIELDS = ("id", "vigencia_id", "channel", "status", "message", "created_at")
+
+
+class MonthlyArchive:
+    """
+    notification_logs-AAAA-MM.jsonl.gz al que cada bloque agrega un miembro gzip completo.
+
+    Junto al archivo, un .state (escrito de forma atómica) guarda su tamaño
+    válido y el último id archivado. Si el proceso muere a mitad de un bloque,
+    la siguiente corrida recorta lo escrito después de ese tamaño (un miembro
+    sin cerrar dejaría el archivo ilegible) y no vuelve a escribir las filas
+    que ya estaban archivadas pero no se alcanzaron a borrar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state_path = path.with_name(path.name + ".state")
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            state = {"size": self.path.stat().st_size if self.path.exists() else 0, "last_id": 0}
+        self.size = state["size"]
+        self.last_id = state["last_id"]
+        if self.path.exists() and self.path.stat().st_size > self.size:
+            with open(self.path, "r+b") as fh:
+                fh.truncate(self.size)
+
+    def append(self, rows):
+        """Agrega las filas que aún no estaban archivadas y deja todo en disco"""
+        rows = [row for row in rows if row["id"] > self.last_id]
+        if not rows:
+            return
+        data = "".join(json.dumps(row, default=str, ensure_ascii=False) + "\n" for row in rows)
+        with open(self.path, "ab") as fh:
+            fh.write(gzip.compress(data.encode("utf-8")))
+            fh.flush()
+            os.fsync(fh.fileno())
+            self.size = fh.tell()
+        self.last_id = rows[-1]["id"]
+        tmp = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"size": self.size, "last_id": self.last_id}), encoding="utf-8")
+        os.replace(tmp, self.state_path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve los NotificationLog más viejos que --older-than días a archivos "
+        "JSONL comprimidos por mes (notification_logs-AAAA-MM.jsonl.gz), por bloques"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            required=True,
+            help='Archivar los logs con más de N días',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Filas por bloque: cada bloque se escribe y se borra en su propia transacción (default: 2000)',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Carpeta de los archivos (default: REMINDERS_LOG_ARCHIVE_DIR)',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Segundos de espera entre bloques para no competir con los envíos',
+        )
+        parser.add_argument(
+            '--compact',
+            action='store_true',
+            help='Al terminar, recuperar el espacio de la tabla (OPTIMIZE TABLE / VACUUM)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar cuántas filas se archivarían',
+        )
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 1:
+            raise CommandError("--older-than debe ser al menos 1 día")
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        old = NotificationLog.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"[DRY RUN] {old.count()} logs anteriores a {cutoff:%Y-%m-%d} se archivarían")
+            return
+
+        archive_dir = Path(options['archive_dir'] or settings.REMINDERS_LOG_ARCHIVE_DIR)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        chunk_size = max(1, options['chunk_size'])
+        files = {}
+        total = 0
+        last_id = 0
+        start = time.perf_counter()
+        while True:
+            rows = list(old.filter(id__gt=last_id).order_by("id").values(*FIELDS)[:chunk_size])
+            if not rows:
+                break
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(f"{row['created_at']:%Y-%m}", []).append(row)
+            for month, month_rows in by_month.items():
+                if month not in files:
+                    files[month] = MonthlyArchive(archive_dir / f"notification_logs-{month}.jsonl.gz")
+                files[month].append(month_rows)
+            # Lo archivado quedó cerrado y en disco antes de borrarlo de la tabla
+            ids = [row["id"] for row in rows]
+            with transaction.atomic():
+                NotificationLog.objects.filter(id__in=ids).delete()
+            total += len(rows)
+            last_id = ids[-1]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        if options['compact'] and total:
+            self._compact()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. {total} logs archivados en {len(files)} archivos de {archive_dir} ({elapsed:.2f}s)"
+        ))
+
+    def _compact(self):
+        table = connection.ops.quote_name(NotificationLog._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute(f"OPTIMIZE TABLE {table}")
+            elif connection.vendor == "sqlite":
+                cursor.execute("VACUUM")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"VACUUM ANALYZE {table}")
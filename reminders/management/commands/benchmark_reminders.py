@@ -0,0 +1,390 @@
+import os
+import random
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from core.models import FCMToken, PlanChoices, Profile, Vehicle, Vigencia, VigenciaType
+from reminders.email_channel import EmailBatchSender
+from reminders.message_templates import MessageTemplates
+from reminders.models import ChannelChoices
+from reminders.selection import REMINDER_OFFSETS, candidate_dates, candidate_queryset
+from reminders.standins import SMTPSink, TwilioStandIn, standin_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la selección de candidatas de send_reminders sobre datos sembrados "
+        "(dentro de una transacción que se revierte al final), con --plan el "
+        "planificador completo, con --render el armado de mensajes, con "
+        "--email el envío de emails contra un servidor SMTP local, o con "
+        "--pipeline send_reminders completo contra proveedores falsos locales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default="10000,100000,1000000",
+            help='Tamaños de tabla (filas de Vigencia) separados por coma',
+        )
+        parser.add_argument(
+            '--candidates',
+            type=int,
+            default=500,
+            help='Vigencias que vencen en fechas candidatas (fijas para todos los tamaños)',
+        )
+        parser.add_argument(
+            '--full-scan',
+            action='store_true',
+            help='Medir también el recorrido completo de vigencias activas (comportamiento anterior)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Filas por bulk_create al sembrar',
+        )
+        parser.add_argument(
+            '--plan',
+            type=int,
+            help='Sembrar N vigencias candidatas y medir send_reminders --plan-out por fase',
+        )
+        parser.add_argument(
+            '--owners',
+            type=int,
+            default=1000,
+            help='Dueños entre los que se reparten las vigencias de --plan',
+        )
+        parser.add_argument(
+            '--plan-out',
+            default=os.devnull,
+            help='Archivo donde dejar el plan de --plan (por defecto se descarta)',
+        )
+        parser.add_argument(
+            '--render',
+            type=int,
+            help='Armar N emails con f-strings y con las plantillas compiladas (en memoria)',
+        )
+        parser.add_argument(
+            '--pipeline',
+            type=int,
+            help='Sembrar N vigencias candidatas y correr send_reminders contra SMTP, Twilio y FCM falsos',
+        )
+        parser.add_argument(
+            '--pro-ratio',
+            type=float,
+            default=0.1,
+            help='Fracción de dueños PRO con WhatsApp en --pipeline',
+        )
+        parser.add_argument(
+            '--push-ratio',
+            type=float,
+            default=0.3,
+            help='Fracción de dueños con token FCM en --pipeline',
+        )
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=0.0,
+            help='Latencia media (±50%%) de los proveedores falsos en --pipeline',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Fracción de envíos que fallan en los proveedores falsos de --pipeline',
+        )
+        parser.add_argument(
+            '--whatsapp-rate',
+            type=float,
+            default=500.0,
+            help='Límite de WhatsApp (mensajes/s) durante --pipeline (el real es WHATSAPP_RATE_PER_SECOND)',
+        )
+        parser.add_argument(
+            '--email',
+            type=int,
+            help='Medir el envío de N emails (send_mail por mensaje vs conexión reutilizada)',
+        )
+        parser.add_argument(
+            '--smtp-host',
+            default="127.0.0.1",
+            help='Servidor SMTP de prueba (ej: python -m aiosmtpd -n -l 127.0.0.1:8025)',
+        )
+        parser.add_argument(
+            '--smtp-port',
+            type=int,
+            default=8025,
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Repeticiones por medición (se reporta la mejor)',
+        )
+
+    def handle(self, *args, **options):
+        if options['email']:
+            return self._benchmark_email(options)
+        if options['plan']:
+            return self._benchmark_plan(options)
+        if options['render']:
+            return self._benchmark_render(options)
+        if options['pipeline']:
+            return self._benchmark_pipeline(options)
+
+        try:
+            sizes = sorted(int(x) for x in options['sizes'].split(",") if x.strip())
+        except ValueError:
+            raise CommandError("--sizes debe ser una lista de enteros separados por coma")
+
+        today = timezone.localdate()
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            owner = User.objects.create(username=f"bench-{int(time.time())}", email="bench@example.com")
+            vehicle = Vehicle.objects.create(owner=owner, alias="Bench")
+            dates = candidate_dates(today)
+            seeded = self._seed(vehicle, options['candidates'], options['batch_size'], rng,
+                                lambda: rng.choice(dates))
+
+            for size in sizes:
+                seeded += self._seed(vehicle, size - seeded, options['batch_size'], rng,
+                                     lambda: self._non_candidate_date(today, dates, rng))
+                elapsed, candidates = self._measure(lambda: candidate_queryset(today), options['repeat'])
+                line = f"filas={seeded:>9} | candidatas={candidates:>6} | selección={elapsed * 1000:8.1f} ms"
+                if options['full_scan']:
+                    full, _ = self._measure(
+                        lambda: Vigencia.objects.filter(activo=True).select_related(
+                            "vehicle", "vehicle__owner", "vehicle__owner__profile"),
+                        1,
+                    )
+                    line += f" | escaneo completo={full * 1000:8.1f} ms"
+                self.stdout.write(line)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark terminado (datos revertidos)."))
+
+    def _seed(self, vehicle, count, batch_size, rng, pick_date):
+        tipos = [choice for choice, _ in VigenciaType.choices]
+        created = 0
+        while created < count:
+            n = min(batch_size, count - created)
+            Vigencia.objects.bulk_create([
+                Vigencia(
+                    vehicle=vehicle,
+                    tipo=rng.choice(tipos),
+                    fecha_vencimiento=pick_date(),
+                    activo=True,
+                )
+                for _ in range(n)
+            ])
+            created += n
+        return created
+
+    def _non_candidate_date(self, today, dates, rng):
+        while True:
+            fecha = today + timedelta(days=rng.randint(-30, 730))
+            if fecha not in dates:
+                return fecha
+
+    def _measure(self, build_queryset, repeat):
+        best = None
+        candidates = 0
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            candidates = sum(1 for _ in build_queryset().iterator())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, candidates
+
+    def _benchmark_plan(self, options):
+        today = timezone.localdate()
+        rng = random.Random(42)
+        stamp = int(time.time())
+
+        with transaction.atomic():
+            owners = User.objects.bulk_create([
+                User(username=f"bench-{stamp}-{i}", email=f"bench{i}@example.com")
+                for i in range(max(1, options['owners']))
+            ], batch_size=options['batch_size'])
+            vehicles = Vehicle.objects.bulk_create(
+                [Vehicle(owner=owner, alias="Bench") for owner in owners],
+                batch_size=options['batch_size'],
+            )
+            dates = candidate_dates(today)
+            created = 0
+            while created < options['plan']:
+                n = min(options['batch_size'], options['plan'] - created)
+                Vigencia.objects.bulk_create([
+                    Vigencia(vehicle=rng.choice(vehicles), tipo=VigenciaType.SOAT, fecha_vencimiento=rng.choice(dates))
+                    for _ in range(n)
+                ])
+                created += n
+
+            out = StringIO()
+            start = time.perf_counter()
+            call_command('send_reminders', '--plan-out', options['plan_out'], stdout=out)
+            elapsed = time.perf_counter() - start
+            for line in out.getvalue().splitlines():
+                if line.startswith(("Tiempos:", "Plan:")):
+                    self.stdout.write(line)
+            self.stdout.write(f"vigencias={created} | total={elapsed:.2f}s ({created / elapsed:.0f} filas/s)")
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark terminado (datos revertidos)."))
+
+    def _benchmark_pipeline(self, options):
+        today = timezone.localdate()
+        rng = random.Random(42)
+        stamp = int(time.time())
+        batch_size = options['batch_size']
+        faults = {"latency": options['latency_ms'] / 1000, "error_rate": options['error_rate']}
+        smtp = SMTPSink(**faults).start()
+        twilio = TwilioStandIn(**faults).start()
+
+        try:
+            with transaction.atomic():
+                owners = User.objects.bulk_create([
+                    User(username=f"bench-{stamp}-{i}", email=f"bench{i}@example.com")
+                    for i in range(max(1, options['owners']))
+                ], batch_size=batch_size)
+                # bulk_create no dispara la señal que crea el perfil
+                Profile.objects.bulk_create([
+                    Profile(user=owner, plan=PlanChoices.PRO, whatsapp_enabled=True, phone=f"+57300{i:07d}")
+                    if rng.random() < options['pro_ratio'] else Profile(user=owner)
+                    for i, owner in enumerate(owners)
+                ], batch_size=batch_size)
+                FCMToken.objects.bulk_create([
+                    FCMToken(user=owner, token=f"bench-{stamp}-{owner.pk}")
+                    for owner in owners if rng.random() < options['push_ratio']
+                ], batch_size=batch_size)
+                vehicles = Vehicle.objects.bulk_create(
+                    [Vehicle(owner=owner, alias="Bench", plate=f"B{i:05d}") for i, owner in enumerate(owners)],
+                    batch_size=batch_size,
+                )
+                dates = candidate_dates(today)
+                tipos = [choice for choice, _ in VigenciaType.choices]
+                created = 0
+                while created < options['pipeline']:
+                    n = min(batch_size, options['pipeline'] - created)
+                    Vigencia.objects.bulk_create([
+                        Vigencia(vehicle=rng.choice(vehicles), tipo=rng.choice(tipos), fecha_vencimiento=rng.choice(dates))
+                        for _ in range(n)
+                    ])
+                    created += n
+
+                out = StringIO()
+                with override_settings(WHATSAPP_RATE_PER_SECOND=options['whatsapp_rate'],
+                                       WHATSAPP_BURST=max(1, int(options['whatsapp_rate'])),
+                                       REMINDERS_RETRY_MAX_ATTEMPTS=1,
+                                       **standin_settings(smtp, twilio, fcm=True)):
+                    start = time.perf_counter()
+                    call_command('send_reminders', stdout=out)
+                    elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+        finally:
+            smtp.stop()
+            twilio.stop()
+
+        for line in out.getvalue().splitlines():
+            if line.startswith(("Listo.", "Tiempos:", "EMAIL:", "WHATSAPP:", "PUSH:", "Base de datos:")):
+                self.stdout.write(line)
+        sent = smtp.received + twilio.requests
+        self.stdout.write(
+            f"vigencias={created} | total={elapsed:.2f}s ({created / elapsed:.0f} vigencias/s) | "
+            f"SMTP={smtp.received} aceptados/{smtp.rejected} rechazados | Twilio={twilio.requests} | "
+            f"envíos por segundo (SMTP+Twilio)={sent / elapsed:.0f}"
+        )
+        self.stdout.write(self.style.SUCCESS("Benchmark terminado (datos revertidos)."))
+
+    def _benchmark_render(self, options):
+        today = timezone.localdate()
+        rng = random.Random(42)
+        tipos = [choice for choice, _ in VigenciaType.choices]
+        owners = [User(username=f"user{i}") for i in range(100)]
+        vehicles = [Vehicle(owner=owner, alias=f"Carro {i}", plate=f"ABC{i:03d}") for i, owner in enumerate(owners)]
+        jobs = []
+        for _ in range(options['render']):
+            days_left = rng.choice(REMINDER_OFFSETS)
+            vigencia = Vigencia(
+                vehicle=rng.choice(vehicles), tipo=rng.choice(tipos),
+                fecha_vencimiento=today + timedelta(days=days_left),
+            )
+            jobs.append((vigencia, days_left))
+
+        # Ambas variantes guardan (asunto, cuerpo) de cada mensaje, como lo usaría el envío
+        def with_fstrings():
+            rendered = []
+            for v, days_left in jobs:
+                subject = f"[Mis Vigencias] {v.get_tipo_display()} vence en {days_left} día(s)"
+                body = (
+                    f"Hola {v.vehicle.owner.username},\n\n"
+                    f"Te recordamos que tu {v.get_tipo_display()} del vehículo '{v.vehicle.alias}' "
+                    f"vence el {v.fecha_vencimiento}.\n"
+                    f"Días restantes: {days_left}\n\n"
+                    f"Si ya renovaste, entra al dashboard y márcalo como 'Renové'.\n\n"
+                    f"— Mis Vigencias"
+                )
+                rendered.append((subject, body))
+            return rendered
+
+        templates = MessageTemplates()
+
+        def with_templates():
+            rendered = []
+            for v, days_left in jobs:
+                rendered.append(templates.render(ChannelChoices.EMAIL, v, days_left))
+            return rendered
+
+        for label, render in (("f-strings + get_tipo_display", with_fstrings), ("plantillas compiladas", with_templates)):
+            best = None
+            for _ in range(max(1, options['repeat'])):
+                start = time.perf_counter()
+                render()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f"{label:<30} {len(jobs)} mensajes en {best * 1000:8.1f} ms ({best / len(jobs) * 1e6:.2f} µs/mensaje)"
+            )
+
+    def _benchmark_email(self, options):
+        backend = "django.core.mail.backends.smtp.EmailBackend"
+        smtp = {"host": options['smtp_host'], "port": options['smtp_port'], "use_tls": False}
+        total = options['email']
+        messages = [
+            EmailMessage(subject=f"[Bench] {i}", body="Benchmark", to=[f"user{i}@example.com"])
+            for i in range(total)
+        ]
+
+        start = time.perf_counter()
+        for message in messages:
+            send_mail(message.subject, message.body, None, message.to,
+                      connection=self._smtp_connection(backend, smtp))
+        per_message = time.perf_counter() - start
+
+        sender = EmailBatchSender(backend=backend, **smtp)
+        start = time.perf_counter()
+        results = sender.send(messages)
+        batched = time.perf_counter() - start
+        failed = sum(1 for _, error in results if error is not None)
+
+        self.stdout.write(
+            f"send_mail por mensaje: {total} emails en {per_message:.2f}s ({total / per_message:.0f}/s)"
+        )
+        self.stdout.write(
+            f"conexión reutilizada:  {total} emails en {batched:.2f}s ({total / batched:.0f}/s) | "
+            f"conexiones={sender.connections_opened} | fallidos={failed}"
+        )
+
+    def _smtp_connection(self, backend, smtp):
+        return get_connection(backend=backend, fail_silently=False, **smtp)
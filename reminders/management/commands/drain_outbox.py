@@ -0,0 +1,155 @@
+import os
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.utils import timezone
+
+from reminders import outbox
+from reminders.channels import build_channels, deactivate_tokens
+from reminders.dispatcher import DeliveryResult, ReminderDispatcher
+from reminders.ledger import DeliveryLedger
+from reminders.log_writer import NotificationLogWriter
+from reminders.models import ChannelChoices, OutboxMessage, OutboxStatus, StatusChoices
+from reminders.retry import CircuitBreaker
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía los recordatorios guardados en el outbox (send_reminders --outbox) y "
+        "reintenta con backoff los envíos fallidos que ya están vencidos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Mensajes que toma el worker por vuelta (default: REMINDERS_OUTBOX_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Terminar cuando el outbox quede vacío en lugar de seguir esperando',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5.0,
+            help='Segundos de espera cuando no hay mensajes pendientes (default: 5)',
+        )
+        parser.add_argument(
+            '--worker-id',
+            default='',
+            help='Identificador del worker (default: host:pid)',
+        )
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or f"{socket.gethostname()}:{os.getpid()}"
+        batch_size = max(1, options['batch_size'] or settings.REMINDERS_OUTBOX_BATCH_SIZE)
+        channels = build_channels()
+        self.breakers = {name: CircuitBreaker() for name in channels}
+        self.counts = {"sent": 0, "failed": 0, "retrying": 0, "deferred": 0, "batches": 0}
+        # Para la tasa efectiva: mensajes enviados entre el primer y el último lote con envíos
+        self.first_sent_at = self.last_sent_at = None
+        self.sent_messages = 0
+
+        self.stdout.write(f"Worker {worker_id}: lotes de {batch_size}")
+        try:
+            while True:
+                requeued = outbox.requeue_stale()
+                if requeued:
+                    self.stdout.write(f"{requeued} mensajes colgados devueltos a pendientes")
+                rows = outbox.claim_batch(worker_id, batch_size)
+                if not rows:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                self._process(rows, channels)
+        except KeyboardInterrupt:
+            # Lo que quedó en PROCESSING vuelve a pendientes con requeue_stale
+            self.stdout.write("Interrumpido")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. Enviados={self.counts['sent']} | Fallidos={self.counts['failed']} | "
+            f"Reintentos={self.counts['retrying']} | Diferidos={self.counts['deferred']} | "
+            f"Lotes={self.counts['batches']}"
+        ))
+        if self.sent_messages:
+            elapsed = self.last_sent_at - self.first_sent_at
+            self.stdout.write(
+                f"Tasa efectiva: {self.sent_messages / max(elapsed, 1.0):.1f} mensajes/s "
+                f"({self.sent_messages} mensajes en {elapsed:.0f}s)"
+            )
+
+    def _process(self, rows, channels):
+        """Envía un lote y deja registrado el resultado en outbox, ledger y NotificationLog"""
+        self.counts["batches"] += 1
+        by_id = {row.id: row for row in rows}
+        dispatcher = ReminderDispatcher(channels)
+        results = []
+        deferred = defaultdict(list)
+        for message in outbox.to_reminder_messages(rows):
+            if message.channel not in channels:
+                results.append(DeliveryResult(message, error=RuntimeError(f"Canal {message.channel} deshabilitado")))
+            elif self.breakers[message.channel].is_open:
+                # Proveedor caído: no se le envía nada hasta que pase el cooldown
+                deferred[message.channel].append(message.outbox_id)
+            else:
+                dispatcher.submit(message)
+        results.extend(dispatcher.close())
+
+        now = timezone.now()
+        for channel, ids in deferred.items():
+            outbox.defer(ids, now + timedelta(seconds=self.breakers[channel].retry_in()))
+            self.counts["deferred"] += len(ids)
+        sent_ids = []
+        delivered = defaultdict(list)
+        failed = defaultdict(list)
+        with NotificationLogWriter() as log:
+            for result in results:
+                row = by_id[result.message.outbox_id]
+                key = (row.run_id, row.target_date)
+                breaker = self.breakers.get(row.channel)
+                if breaker:
+                    breaker.record(result.ok)
+                if result.ok:
+                    sent_ids.append(row.id)
+                elif outbox.retry_later(row, result.error, now):
+                    # Queda otro intento: el reclamo del ledger sigue tomado y solo se registra el resultado final
+                    self.counts["retrying"] += 1
+                    continue
+                # Un digest se registra por cada vigencia que agrupa
+                for message in result.message.items or (result.message,):
+                    if result.ok:
+                        delivered[key].append(message)
+                        self.counts["sent"] += 1
+                    else:
+                        failed[key].append(message)
+                        self.counts["failed"] += 1
+                    log.add(
+                        vigencia=message.vigencia,
+                        channel=message.channel,
+                        status=StatusChoices.SENT if result.ok else StatusChoices.FAILED,
+                        message=result.detail if result.ok else str(result.error)[:255],
+                    )
+                    if result.ok and message.channel == ChannelChoices.WHATSAPP:
+                        self.stdout.write(f"[WHATSAPP] {message.vigencia.vehicle.owner.username}: {result.detail}")
+
+        if sent_ids:
+            self.last_sent_at = time.monotonic()
+            self.first_sent_at = self.first_sent_at or self.last_sent_at
+            self.sent_messages += len(sent_ids)
+            OutboxMessage.objects.filter(id__in=sent_ids).update(
+                status=OutboxStatus.SENT, sent_at=now, attempts=F("attempts") + 1,
+            )
+        for (run_id, target_date), messages in delivered.items():
+            DeliveryLedger(target_date, run_id=run_id).confirm(messages)
+        for (run_id, target_date), messages in failed.items():
+            DeliveryLedger(target_date, run_id=run_id).release(messages)
+        deactivate_tokens({token for result in results for token in result.dead_tokens})
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Vigencia
+
+
+class Command(BaseCommand):
+    help = "Recalcula Vigencia.next_reminder_at de todas las vigencias (reparación)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Vigencias por bloque de bulk_update (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        total = Vigencia.objects.all().refresh_next_reminder(batch_size=max(1, options['batch_size']))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. {total} vigencias revisadas en {elapsed:.2f}s"
+        ))
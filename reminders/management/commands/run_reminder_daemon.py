@@ -0,0 +1,92 @@
+import time as time_module
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reminders.management.commands.send_reminders import Command as SendRemindersCommand
+from reminders.schedule import ReminderSchedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Demonio de recordatorios: carga una vez la agenda de los próximos días, "
+        "la mantiene al día con los cambios en Vigencia y envía cada recordatorio a su hora. "
+        "La hora de envío es una sola para todos los usuarios (--hour), no por usuario. "
+        "Las vigencias borradas o desactivadas sin save() no se ven entre revisiones: "
+        "se descartan al volver a consultarlas justo antes de enviar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hour',
+            type=int,
+            default=None,
+            help='Hora local de envío, la misma para todos los usuarios (default: REMINDERS_SEND_HOUR)',
+        )
+        parser.add_argument(
+            '--horizon-days',
+            type=int,
+            default=2,
+            help='Días hacia adelante que se mantienen en memoria (default: 2)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=60.0,
+            help='Segundos entre revisiones de vigencias modificadas (default: 60)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Enviar lo que ya venció y terminar',
+        )
+
+    def handle(self, *args, **options):
+        hour = settings.REMINDERS_SEND_HOUR if options['hour'] is None else options['hour']
+        schedule = ReminderSchedule(hour, max(0, options['horizon_days']))
+        sender = SendRemindersCommand(stdout=self.stdout, stderr=self.stderr)
+        send_options = vars(sender.create_parser("manage.py", "send_reminders").parse_args([]))
+
+        today = timezone.localdate()
+        last_poll = timezone.now()
+        loaded = schedule.load(today)
+        self.stdout.write(f"Agenda cargada: {loaded} recordatorios hasta {schedule.horizon} (envío {hour:02d}:00)")
+
+        try:
+            while True:
+                now = timezone.now()
+                if timezone.localdate() != today:
+                    today = timezone.localdate()
+                    self.stdout.write(f"Nuevo día {today}: {schedule.load(today)} recordatorios agregados")
+
+                # Un poco de solapamiento para no perder cambios guardados durante la consulta anterior
+                changed = schedule.apply_changes(last_poll - timedelta(seconds=1))
+                last_poll = now
+                if changed:
+                    self.stdout.write(f"{changed} vigencias modificadas, agenda con {len(schedule)}")
+
+                due = schedule.pop_due(now)
+                if due:
+                    # Borradas o desactivadas desde que se agendaron
+                    active = schedule.active(due)
+                    if len(active) < len(due):
+                        self.stdout.write(f"{len(due) - len(active)} vigencias borradas o inactivas descartadas")
+                    due = active
+                if due:
+                    self.stdout.write(f"{now:%H:%M} enviando {len(due)} recordatorios")
+                    sender.run_shard(today, send_options, vigencia_ids=due)
+                    # Sin reintentos en el outbox, lo fallido no sale de la agenda
+                    if sender.failed_ids:
+                        schedule.retry(sender.failed_ids, timezone.now())
+
+                if options['once']:
+                    break
+                next_due = schedule.next_due()
+                wait = options['poll_interval']
+                if next_due is not None:
+                    wait = min(wait, max(0.0, (next_due - timezone.now()).total_seconds()))
+                time_module.sleep(wait)
+        except KeyboardInterrupt:
+            self.stdout.write("Detenido")
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reminders.standins import SMTPSink, TwilioStandIn
+
+
+class Command(BaseCommand):
+    help = (
+        "Levanta un SMTP (aiosmtpd) y un Twilio falsos locales, con latencia y errores "
+        "configurables, para pruebas de carga de send_reminders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--smtp-port', type=int, default=8025)
+        parser.add_argument('--twilio-port', type=int, default=8026)
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=0.0,
+            help='Latencia media por mensaje (±50%%) en milisegundos',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0.0,
+            help='Fracción de mensajes que fallan (0 a 1)',
+        )
+        parser.add_argument(
+            '--report-every',
+            type=float,
+            default=10.0,
+            help='Segundos entre reportes de contadores',
+        )
+
+    def handle(self, *args, **options):
+        faults = {"latency": options['latency_ms'] / 1000, "error_rate": options['error_rate']}
+        smtp = SMTPSink(options['host'], options['smtp_port'], **faults).start()
+        twilio = TwilioStandIn(options['host'], options['twilio_port'], **faults).start()
+
+        self.stdout.write("Proveedores falsos listos. Para apuntar send_reminders a ellos:")
+        self.stdout.write(f"  EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend EMAIL_HOST={smtp.host} "
+                          f"EMAIL_PORT={smtp.port} EMAIL_USE_TLS=false")
+        self.stdout.write(f"  WHATSAPP_ENABLED=true TWILIO_API_BASE_URL={twilio.base_url} "
+                          f"TWILIO_ACCOUNT_SID=ACstandin TWILIO_AUTH_TOKEN=standin")
+        self.stdout.write("  FIREBASE_MESSAGING_BACKEND=reminders.standins.FakeMessaging "
+                          f"STANDIN_FCM_LATENCY={faults['latency']} STANDIN_FCM_ERROR_RATE={faults['error_rate']}")
+        try:
+            while True:
+                time.sleep(options['report_every'])
+                self.stdout.write(
+                    f"SMTP: {smtp.received} aceptados / {smtp.rejected} rechazados | "
+                    f"Twilio: {twilio.requests} peticiones (máx. simultáneas {twilio.max_active})"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo")
+        finally:
+            smtp.stop()
+            twilio.stop()
@@ -1,15 +1,34 @@
 # MODIFICAR reminders/management/commands/send_reminders.py
-from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
+import multiprocessing
+from collections import defaultdict
+from pathlib import Path
+from contextlib import ExitStack, nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.conf import settings
 
-from core.models import Vigencia, PlanChoices
-from reminders.models import NotificationLog, ChannelChoices, StatusChoices
+from core.models import FCMToken, PlanChoices
+from reminders.channels import build_channels, deactivate_tokens
+from reminders.checkpoint import RunCheckpoint
+from reminders import outbox
+from reminders.digest import build_digests
+from reminders.dispatcher import ReminderDispatcher, ReminderMessage
+from reminders.ledger import DeliveryLedger
+from reminders.log_writer import NotificationLogWriter
+from reminders.message_templates import get_templates
+from reminders.models import ChannelChoices, StatusChoices
+from reminders.metrics import RunMetrics
+from reminders.plan import PhaseTimer, PlanWriter
+from reminders.retry import CircuitBreaker
+from reminders.selection import candidate_queryset, iter_candidates
+from reminders.spread import SendSpreader, parse_duration
 
 
 class Command(BaseCommand):
-    help = "Envía recordatorios de vigencias (30/15/7/1 días) por email. WhatsApp solo PRO (pendiente)."
+    help = "Envía recordatorios de vigencias (30/15/7/1 días) por email, WhatsApp (solo PRO) y push."
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -17,133 +36,477 @@ class Command(BaseCommand):
             action='store_true',
             help='Modo de prueba (no envía emails reales)',
         )
+        parser.add_argument(
+            '--plan-out',
+            help='No enviar: escribir en este archivo (JSONL) cada mensaje que se enviaría',
+        )
         parser.add_argument(
             '--days',
             type=int,
             help='Simular recordatorio para X días en el futuro',
         )
+        parser.add_argument(
+            '--log-chunk-size',
+            type=int,
+            help='NotificationLog por INSERT (por defecto REMINDERS_LOG_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--email-batch-size',
+            type=int,
+            help='Emails por conexión SMTP (por defecto REMINDERS_EMAIL_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--email-workers',
+            type=int,
+            help='Hilos para el canal email (por defecto REMINDERS_EMAIL_WORKERS)',
+        )
+        parser.add_argument(
+            '--whatsapp-workers',
+            type=int,
+            help='Hilos para el canal WhatsApp (por defecto REMINDERS_WHATSAPP_WORKERS)',
+        )
+        parser.add_argument(
+            '--push-workers',
+            type=int,
+            help='Hilos para el canal push (por defecto REMINDERS_PUSH_WORKERS)',
+        )
+        parser.add_argument(
+            '--digest',
+            action='store_true',
+            help='Un solo email por dueño con todas sus vigencias del día',
+        )
+        parser.add_argument(
+            '--outbox',
+            action='store_true',
+            help='No enviar: guardar los mensajes en el outbox para que los envíe drain_outbox',
+        )
+        parser.add_argument(
+            '--spread-over',
+            help='Repartir los envíos en una ventana (ej: 2h, 90m): cada dueño sale en un horario fijo '
+                 'dentro de ella, vía outbox y drain_outbox (implica --outbox)',
+        )
+        parser.add_argument(
+            '--reclaim-after',
+            type=int,
+            help='Minutos tras los que se retoma un envío reclamado por una corrida caída '
+                 '(por defecto REMINDERS_CLAIM_STALE_MINUTES)',
+        )
+        parser.add_argument(
+            '--metrics-file',
+            help='Archivo .prom (textfile collector de node-exporter) con las métricas de la corrida '
+                 '(default: REMINDERS_METRICS_FILE)',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Retomar la corrida de hoy desde el último checkpoint (tras una caída); '
+                 'retoma de inmediato los envíos que la corrida caída dejó reclamados',
+        )
+        parser.add_argument(
+            '--shard',
+            help='Procesar solo el shard INDEX/COUNT (por id del dueño), ej: 0/4',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Procesos locales: reparte los shards 0..N-1 y suma los resultados',
+        )
 
     def handle(self, *args, **options):
         today = timezone.localdate()
-        
+
         # Si se especificó días, simular esa fecha
         if options['days']:
             today = today + timezone.timedelta(days=options['days'])
             self.stdout.write(f"Modo simulación: {today} (+{options['days']} días)")
-        
-        sent = 0
-        skipped = 0
-        failed = 0
-        whatsapp_sent = 0
-
-        qs = Vigencia.objects.filter(activo=True).select_related("vehicle", "vehicle__owner", "vehicle__owner__profile")
-
-        for v in qs:
-            owner = v.vehicle.owner
-            profile = getattr(owner, 'profile', None)
-            
-            # ===== EMAIL =====
-            email = owner.email or ""
-            if email:
-                days_left = (v.fecha_vencimiento - today).days
-                
-                should_send_email = (
-                    (days_left == 30 and v.r30) or
-                    (days_left == 15 and v.r15) or
-                    (days_left == 7 and v.r7) or
-                    (days_left == 1 and v.r1) or
-                    (days_left == 0)  # hoy vence
-                )
-                
-                if should_send_email:
-                    if not options['test']:
-                        try:
-                            subject = f"[Mis Vigencias] {v.get_tipo_display()} vence en {days_left} día(s)"
-                            body = (
-                                f"Hola {owner.username},\n\n"
-                                f"Te recordamos que tu {v.get_tipo_display()} del vehículo '{v.vehicle.alias}' "
-                                f"vence el {v.fecha_vencimiento}.\n"
-                                f"Días restantes: {days_left}\n\n"
-                                f"Si ya renovaste, entra al dashboard y márcalo como 'Renové'.\n\n"
-                                f"— Mis Vigencias"
-                            )
-                            
-                            send_mail(
-                                subject=subject,
-                                message=body,
-                                from_email=None,
-                                recipient_list=[email],
-                                fail_silently=False,
-                            )
-                            
-                            NotificationLog.objects.create(
-                                vigencia=v,
-                                channel=ChannelChoices.EMAIL,
-                                status=StatusChoices.SENT,
-                                message=f"Email enviado a {email} (days_left={days_left})",
-                            )
-                            sent += 1
-                            
-                        except Exception as e:
-                            NotificationLog.objects.create(
-                                vigencia=v,
-                                channel=ChannelChoices.EMAIL,
-                                status=StatusChoices.FAILED,
-                                message=str(e)[:255],
-                            )
-                            failed += 1
-                    else:
-                        # Modo prueba
-                        self.stdout.write(
-                            f"[TEST] Email para {owner.email}: {v.get_tipo_display()} "
-                            f"vence en {days_left} días"
-                        )
-                        sent += 1
-            
-            else:
-                NotificationLog.objects.create(
+
+        shard = parse_shard(options['shard']) if options['shard'] else None
+        workers = options['workers'] or 1
+        if workers > 1 and shard:
+            raise CommandError("--workers y --shard no se pueden combinar")
+        if workers > 1 and options['plan_out']:
+            raise CommandError("--plan-out no se puede combinar con --workers")
+        if options['spread_over']:
+            try:
+                options['spread_window'] = parse_duration(options['spread_over'])
+            except ValueError as e:
+                raise CommandError(f"--spread-over: {e}")
+            # Todos los shards reparten sobre la misma ventana
+            options['spread_start'] = timezone.now()
+            options['outbox'] = True
+
+        if workers > 1:
+            counts = self._run_workers(today, options, workers)
+        else:
+            counts = self.run_shard(today, options, shard)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. Enviados={counts['sent']} | WhatsApp={counts['whatsapp']} | "
+            f"Omitidos={counts['skipped']} | Fallidos={counts['failed']} | "
+            f"Push={counts['push']} | Duplicados={counts['duplicated']}"
+        ))
+        if options['digest']:
+            self.stdout.write(f"Digest: {counts['digests']} emails agrupados")
+        if options['outbox']:
+            self.stdout.write(f"Outbox: {counts['queued']} mensajes pendientes para drain_outbox")
+        if options['spread_over']:
+            window = options['spread_window']
+            end = options['spread_start'] + timezone.timedelta(seconds=window)
+            self.stdout.write(
+                f"Spread: {counts['queued']} mensajes repartidos hasta las {timezone.localtime(end):%H:%M} "
+                f"(~{counts['queued'] / window * 60:.1f} mensajes/min)"
+            )
+        if counts['retrying']:
+            self.stdout.write(f"Reintentos: {counts['retrying']} mensajes en el outbox para drain_outbox")
+        if options['plan_out']:
+            self.stdout.write(f"Plan: {counts['planned']} mensajes escritos en {options['plan_out']}")
+
+    def run_shard(self, today, options, shard=None, vigencia_ids=None):
+        """
+        Procesa las vigencias de un shard (o todas) y retorna los contadores.
+
+        Con `vigencia_ids` solo procesa esas (run_reminder_daemon), sin checkpoint.
+        """
+        self.metrics = RunMetrics()
+        with connection.execute_wrapper(self.metrics.db_wrapper):
+            counts = self._run_shard(today, options, shard, vigencia_ids)
+        self.stdout.write(self.metrics.report())
+        path = options.get('metrics_file') or settings.REMINDERS_METRICS_FILE
+        # Un plan (--plan-out) no es una corrida: no pisa las métricas de la última real
+        if path and not options.get('plan_out'):
+            labels = {}
+            if shard:
+                # Un archivo (y una serie) por shard: el collector no acepta series repetidas
+                path = Path(path)
+                path = path.with_name(f"{path.stem}_shard{shard[0]}{path.suffix}")
+                labels["shard"] = shard[0]
+            self.metrics.write(path, self.timer, **labels)
+        return counts
+
+    def _run_shard(self, today, options, shard, vigencia_ids):
+        self.counts = {
+            "sent": 0, "whatsapp": 0, "push": 0, "skipped": 0, "failed": 0, "duplicated": 0, "digests": 0,
+            "queued": 0, "planned": 0, "retrying": 0,
+        }
+        self.failed_ids = set()
+        self.dead_tokens = set()
+        self.timer = PhaseTimer()
+        self.templates = get_templates()
+
+        channels = build_channels(
+            email_workers=options['email_workers'],
+            whatsapp_workers=options['whatsapp_workers'],
+            push_workers=options['push_workers'],
+            email_batch_size=options['email_batch_size'],
+        )
+        push_enabled = ChannelChoices.PUSH in channels
+        self.breakers = {name: CircuitBreaker() for name in channels}
+
+        # Solo las vigencias que vencen en today+30/15/7/1/0 pueden disparar
+        qs = candidate_queryset(today, shard=shard)
+        if vigencia_ids is not None:
+            qs = qs.filter(id__in=vigencia_ids)
+        if push_enabled:
+            qs = qs.prefetch_related(Prefetch(
+                "vehicle__owner__fcm_tokens",
+                queryset=FCMToken.objects.filter(is_active=True),
+                to_attr="active_fcm_tokens",
+            ))
+
+        self.digest = options['digest']
+        self.outbox = options['outbox']
+        self.spreader = None
+        if options.get('spread_window'):
+            self.spreader = SendSpreader(options['spread_window'], options['spread_start'])
+
+        # --test y --plan-out no envían: no reclaman en el ledger ni dejan checkpoint
+        dry_run = options['test'] or bool(options['plan_out'])
+        use_checkpoint = not dry_run and vigencia_ids is None
+        self.checkpoint = RunCheckpoint(today, shard, options['resume']) if use_checkpoint else None
+        if self.checkpoint and self.checkpoint.finished:
+            self.stdout.write(f"La corrida del {today} ya había terminado, nada que retomar")
+            return self.counts
+        dispatcher = ReminderDispatcher(channels, metrics=self.metrics, buffer_size=settings.REMINDERS_FAIR_BUFFER)
+        reclaim_after = options['reclaim_after']
+        if reclaim_after is None and options['resume']:
+            # La corrida que se retoma se cayó: sus reclamos en curso no van a terminar
+            reclaim_after = 0
+        ledger = None if dry_run else DeliveryLedger(today, reclaim_after)
+        chunk_size = settings.REMINDERS_PLAN_CHUNK_SIZE
+        start = self.checkpoint.position if self.checkpoint else (0, 0)
+
+        with ExitStack() as stack:
+            log = stack.enter_context(NotificationLogWriter(options['log_chunk_size']))
+            self.plan = stack.enter_context(PlanWriter(options['plan_out'])) if options['plan_out'] else None
+            try:
+                with self.timer.phase("decision"):
+                    planned = []
+                    last_key = start
+                    # Orden (owner_id, id): las vigencias de un dueño llegan juntas para el digest
+                    for v in self.timer.timed(iter_candidates(qs, start, chunk_size), "query"):
+                        # En modo digest no se corta un bloque a mitad de un dueño
+                        if len(planned) >= chunk_size and (not self.digest or v.vehicle.owner_id != last_key[0]):
+                            self._dispatch(planned, dispatcher, ledger, log, last_key)
+                            planned = []
+                        planned.extend(self._plan(v, today, log, push_enabled))
+                        last_key = (v.vehicle.owner_id, v.id)
+                    self._dispatch(planned, dispatcher, ledger, log, last_key)
+            finally:
+                # Aunque falle la planificación, lo ya encolado se envía y se registra
+                with self.timer.phase("dispatch"):
+                    results = list(dispatcher.close())
+                self._record(results, log, ledger)
+        deactivated = deactivate_tokens(self.dead_tokens)
+        if deactivated:
+            self.stdout.write(f"{deactivated} tokens FCM inválidos desactivados")
+
+        if self.checkpoint:
+            self.checkpoint.finish()
+        # Con --days la fecha es simulada: no se mueve el próximo recordatorio real
+        if ledger is not None and not options.get('days'):
+            # Lo enviado (o encolado) pasa a su siguiente recordatorio; lo fallido queda para reintentar
+            qs.refresh_next_reminder(
+                from_date=today + timezone.timedelta(days=1), skip=self.failed_ids, batch_size=chunk_size,
+            )
+        self.stdout.write(self.timer.report())
+        if shard:
+            self.stdout.write(f"Shard {shard[0]}/{shard[1]}: {self.counts}")
+        return self.counts
+
+    def _run_workers(self, today, options, workers):
+        """Lanza un proceso por shard (fork) y suma sus contadores"""
+        # Cada proceso hijo debe abrir su propia conexión a la base de datos
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        options = {k: v for k, v in options.items() if k not in ("stdout", "stderr")}
+        jobs = [(today, options, (index, workers)) for index in range(workers)]
+        with context.Pool(processes=workers) as pool:
+            results = pool.map(_run_shard_process, jobs)
+        return merge_counts(results)
+
+    def _plan(self, v, today, log, push_enabled):
+        """Decide qué mensajes genera una vigencia hoy"""
+        owner = v.vehicle.owner
+        profile = getattr(owner, 'profile', None)
+        days_left = (v.fecha_vencimiento - today).days
+        messages = []
+
+        # r30..r1 de la vigencia y días de aviso del dueño (incluido el día 0, si lo marcó)
+        offsets = v.reminder_offsets(profile.notification_mask if profile else None)
+        should_send_email = days_left in offsets
+
+        # ===== EMAIL =====
+        email = owner.email or ""
+        if email:
+            if should_send_email:
+                messages.append(ReminderMessage(
+                    vigencia=v,
+                    channel=ChannelChoices.EMAIL,
+                    recipient=email,
+                    days_left=days_left,
+                ))
+        else:
+            # --plan-out no deja rastro en NotificationLog
+            if self.plan is None:
+                log.add(
                     vigencia=v,
                     channel=ChannelChoices.EMAIL,
                     status=StatusChoices.SKIPPED,
                     message="Usuario sin email",
                 )
-                skipped += 1
-            
-            # ===== WHATSAPP (solo PRO) =====
-            if profile and profile.plan == PlanChoices.PRO and profile.whatsapp_enabled and profile.phone:
-                days_left = (v.fecha_vencimiento - today).days
-                
-                should_send_whatsapp = (
-                    (days_left == 7 and v.r7) or
-                    (days_left == 1 and v.r1) or
-                    (days_left == 0)
-                )
-                
-                if should_send_whatsapp:
-                    # Simulación de envío WhatsApp
-                    message = (
-                        f"📱 Recordatorio Mis Vigencias:\n"
-                        f"Tu {v.get_tipo_display()} del vehículo {v.vehicle.alias} "
-                        f"vence el {v.fecha_vencimiento} ({days_left} días).\n"
-                        f"Renueva a tiempo para evitar multas."
+            self.counts["skipped"] += 1
+
+        # ===== WHATSAPP (solo PRO) =====
+        if profile and profile.plan == PlanChoices.PRO and profile.whatsapp_enabled and profile.phone:
+            should_send_whatsapp = days_left in offsets and days_left in (7, 1, 0)
+
+            if should_send_whatsapp:
+                messages.append(ReminderMessage(
+                    vigencia=v,
+                    channel=ChannelChoices.WHATSAPP,
+                    recipient=profile.phone,
+                    days_left=days_left,
+                ))
+
+        # ===== PUSH =====
+        tokens = getattr(owner, 'active_fcm_tokens', None) if push_enabled else None
+        if tokens and should_send_email:
+            messages.append(ReminderMessage(
+                vigencia=v,
+                channel=ChannelChoices.PUSH,
+                recipient=owner.username,
+                days_left=days_left,
+                tokens=tuple(t.token for t in tokens),
+            ))
+
+        return messages
+
+    def _render(self, message):
+        """Arma asunto y cuerpo de un mensaje ya decidido con las plantillas compiladas"""
+        message.subject, message.body = self.templates.render(message.channel, message.vigencia, message.days_left)
+        return message
+
+    def _dispatch(self, planned, dispatcher, ledger, log, last_key):
+        """Reclama en el ledger los mensajes planificados, arma los propios y los encola"""
+        # --test y --plan-out (sin ledger) nunca escriben en el outbox
+        to_outbox = self.outbox and ledger is not None
+        # Con --outbox, reclamo y outbox van en la misma transacción: o quedan ambos o ninguno
+        with transaction.atomic() if to_outbox else nullcontext():
+            if ledger is None:
+                claimed, taken = planned, []
+            else:
+                with self.timer.phase("dispatch"):
+                    claimed, taken = ledger.claim(planned)
+            with self.timer.phase("render"):
+                if self.digest:
+                    claimed = build_digests(claimed)
+                for message in claimed:
+                    if not message.items:
+                        self._render(message)
+            if to_outbox:
+                with self.timer.phase("write"):
+                    self.counts["queued"] += outbox.enqueue(
+                        claimed, ledger, send_at=self.spreader.send_at if self.spreader else None,
                     )
-                    
-                    if not options['test']:
-                        # Aquí iría la integración real con Twilio/API de WhatsApp
-                        # Por ahora solo registramos en logs
-                        NotificationLog.objects.create(
-                            vigencia=v,
-                            channel=ChannelChoices.WHATSAPP,
-                            status=StatusChoices.SENT,
-                            message=f"WhatsApp simulado a {profile.phone}",
-                        )
-                    
-                    whatsapp_sent += 1
-                    self.stdout.write(
-                        f"[WHATSAPP SIMULADO] {owner.username}: {message}"
+        self.counts["duplicated"] += len(taken)
+        self.counts["digests"] += sum(1 for m in claimed if m.items)
+
+        if ledger is None:
+            with self.timer.phase("write"):
+                for message in claimed:
+                    if self.plan:
+                        self.plan.write(message)
+                        self.counts["planned"] += 1
+                    else:
+                        self._print_test(message)
+            return
+        if self.checkpoint:
+            self.checkpoint.track(last_key, [] if self.outbox else claimed)
+        if self.outbox:
+            if self.checkpoint and self.checkpoint.advance():
+                self.checkpoint.save()
+            return
+        with self.timer.phase("dispatch"):
+            deferred = defaultdict(list)
+            for message in claimed:
+                if self.breakers[message.channel].is_open:
+                    deferred[message.channel].append(message)
+                else:
+                    dispatcher.submit(message)
+        if deferred:
+            # Con el circuito abierto no se le envía al proveedor: pasan al outbox hasta el cooldown
+            with self.timer.phase("write"):
+                for channel, messages in deferred.items():
+                    retry_at = timezone.now() + timezone.timedelta(seconds=self.breakers[channel].retry_in())
+                    self.counts["retrying"] += outbox.enqueue(messages, ledger, not_before=retry_at)
+                    if self.checkpoint:
+                        for message in messages:
+                            self.checkpoint.done(message)
+        self._record(dispatcher.poll(), log, ledger)
+
+    def _record(self, results, log, ledger):
+        """Registra en NotificationLog (y en el ledger) los resultados del dispatcher"""
+        with self.timer.phase("write"):
+            self._record_results(results, log, ledger)
+
+    def _record_results(self, results, log, ledger):
+        delivered = []
+        failed = []
+        retries = []
+        retry = settings.REMINDERS_RETRY_MAX_ATTEMPTS > 1 and ledger is not None
+        for result in results:
+            if self.checkpoint:
+                self.checkpoint.done(result.message)
+            self.dead_tokens.update(result.dead_tokens)
+            self.breakers[result.message.channel].record(result.ok)
+            # Los fallidos van al outbox como reintento (drain_outbox registra el resultado final);
+            # sin reintentos se libera el reclamo
+            if not result.ok and retry:
+                retries.append(result)
+                continue
+            # Un digest se registra por cada vigencia que agrupa
+            for message in result.message.items or (result.message,):
+                if result.ok:
+                    delivered.append(message)
+                    log.add(
+                        vigencia=message.vigencia,
+                        channel=message.channel,
+                        status=StatusChoices.SENT,
+                        message=result.detail,
                     )
+                    if message.channel == ChannelChoices.WHATSAPP:
+                        self.counts["whatsapp"] += 1
+                        self.stdout.write(f"[WHATSAPP] {message.vigencia.vehicle.owner.username}: {result.detail}")
+                    elif message.channel == ChannelChoices.PUSH:
+                        self.counts["push"] += 1
+                    else:
+                        self.counts["sent"] += 1
+                else:
+                    failed.append(message)
+                    self.failed_ids.add(message.vigencia.pk)
+                    log.add(
+                        vigencia=message.vigencia,
+                        channel=message.channel,
+                        status=StatusChoices.FAILED,
+                        message=str(result.error)[:255],
+                    )
+                    self.counts["failed"] += 1
+        if ledger is not None:
+            ledger.confirm(delivered)
+            ledger.release(failed)
+            if retries:
+                self.counts["retrying"] += outbox.enqueue(
+                    [r.message for r in retries], ledger, attempts=1, errors=[r.error for r in retries],
+                )
+        if self.checkpoint and self.checkpoint.advance():
+            # Los logs de lo ya registrado deben quedar escritos antes de mover el checkpoint
+            log.flush()
+            self.checkpoint.save()
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Listo. Enviados={sent} | WhatsApp={whatsapp_sent} | "
-            f"Omitidos={skipped} | Fallidos={failed}"
-        ))
\ No newline at end of file
+    def _print_test(self, message):
+        """Modo prueba: solo muestra lo que se enviaría"""
+        v = message.vigencia
+        if message.items:
+            self.stdout.write(f"[TEST] Digest para {message.recipient}: {len(message.items)} vigencias")
+            self.counts["sent"] += len(message.items)
+        elif message.channel == ChannelChoices.EMAIL:
+            self.stdout.write(
+                f"[TEST] Email para {message.recipient}: {v.get_tipo_display()} "
+                f"vence en {message.days_left} días"
+            )
+            self.counts["sent"] += 1
+        elif message.channel == ChannelChoices.WHATSAPP:
+            self.stdout.write(f"[WHATSAPP SIMULADO] {v.vehicle.owner.username}: {message.body}")
+            self.counts["whatsapp"] += 1
+        else:
+            self.stdout.write(f"[TEST] Push para {message.recipient}: {message.subject}")
+            self.counts["push"] += 1
+
+
+def parse_shard(value):
+    """'INDEX/COUNT' -> (index, count)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise CommandError("--shard debe tener el formato INDEX/COUNT, ej: 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise CommandError("--shard: se requiere 0 <= INDEX < COUNT")
+    return index, count
+
+
+def merge_counts(results):
+    """Suma los contadores de varios shards"""
+    total = {}
+    for counts in results:
+        for key, value in counts.items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def _run_shard_process(job):
+    """Punto de entrada de cada proceso de --workers"""
+    today, options, shard = job
+    try:
+        return Command().run_shard(today, options, shard)
+    finally:
+        connections.close_all()
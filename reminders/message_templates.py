@@ -0,0 +1,186 @@
+import logging
+import string
+import threading
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from core.models import VigenciaType
+from reminders.models import ChannelChoices, DaysBucket, ReminderTemplate
+
+logger = logging.getLogger(__name__)
+
+# Campos que se resuelven al compilar (iguales para todos los destinatarios de una clave)
+STATIC_FIELDS = ("tipo", "url")
+# Campos que cambian por destinatario y se sustituyen al enviar
+RECIPIENT_FIELDS = ("usuario", "vehiculo", "placa", "fecha", "dias")
+
+TIPO_LABELS = dict(VigenciaType.choices)
+
+_WHATSAPP_FOOTER = "\n_Mis Vigencias - Recordatorios automáticos_\n"
+
+# Plantillas por defecto: (canal, días) -> (asunto, cuerpo). Las de ReminderTemplate tienen prioridad.
+DEFAULT_TEMPLATES = {
+    (ChannelChoices.EMAIL, DaysBucket.ANY): (
+        "[Mis Vigencias] {tipo} vence en {dias} día(s)",
+        "Hola {usuario},\n\n"
+        "Te recordamos que tu {tipo} del vehículo '{vehiculo}' vence el {fecha}.\n"
+        "Días restantes: {dias}\n\n"
+        "Si ya renovaste, entra al dashboard y márcalo como 'Renové'.\n\n"
+        "— Mis Vigencias",
+    ),
+    (ChannelChoices.WHATSAPP, DaysBucket.TODAY): (
+        "",
+        "\n*🚨 URGENTE: {tipo} VENCE HOY*\n\n"
+        "📋 Documento: {tipo}\n"
+        "🚗 Vehículo: {vehiculo}\n"
+        "📅 Fecha vencimiento: HOY\n"
+        "🔗 Renueva aquí: {url}\n" + _WHATSAPP_FOOTER,
+    ),
+    (ChannelChoices.WHATSAPP, DaysBucket.WEEK): (
+        "",
+        "\n*⚠️ Recordatorio: {tipo} por vencer*\n\n"
+        "📋 Documento: {tipo}\n"
+        "🚗 Vehículo: {vehiculo}\n"
+        "📅 Vence en: {dias} días\n"
+        "🗓️ Fecha: {fecha}\n"
+        "🔗 Ver detalles: {url}\n" + _WHATSAPP_FOOTER,
+    ),
+    (ChannelChoices.WHATSAPP, DaysBucket.ANY): (
+        "",
+        "\n*📅 Recordatorio: {tipo}*\n\n"
+        "📋 Documento: {tipo}\n"
+        "🚗 Vehículo: {vehiculo}\n"
+        "📅 Vence en: {dias} días\n"
+        "🗓️ Fecha: {fecha}\n"
+        "🔗 Ver detalles: {url}\n" + _WHATSAPP_FOOTER,
+    ),
+    (ChannelChoices.PUSH, DaysBucket.ANY): (
+        "{tipo} vence en {dias} día(s)",
+        "{vehiculo}: vence el {fecha}",
+    ),
+}
+# El texto de "por vencer" de WhatsApp cubre también el día antes
+DEFAULT_TEMPLATES[(ChannelChoices.WHATSAPP, DaysBucket.ONE)] = DEFAULT_TEMPLATES[(ChannelChoices.WHATSAPP, DaysBucket.WEEK)]
+
+_formatter = string.Formatter()
+
+
+def _escape(text):
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+def compile_template(text, static):
+    """
+    Sustituye de una vez los campos de `static` y deja el resto como
+    {campo} (con su formato) para el str.format de cada envío.
+    """
+    parts = []
+    for literal, field, spec, conversion in _formatter.parse(text):
+        parts.append(_escape(literal))
+        if field is None:
+            continue
+        if field in static:
+            value = static[field]
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            parts.append(_escape(format(value, spec)))
+        else:
+            parts.append("{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(parts)
+
+
+def validate_template(text):
+    """Mensaje de error si la plantilla usa campos desconocidos o mal formados, si no None"""
+    sample = {
+        "tipo": "SOAT", "url": "https://example.com", "usuario": "usuario", "vehiculo": "Carro",
+        "placa": "ABC123", "fecha": date.today(), "dias": 7,
+    }
+    try:
+        text.format(**sample)
+    except (KeyError, IndexError, ValueError, AttributeError) as e:
+        fields = ", ".join("{" + f + "}" for f in STATIC_FIELDS + RECIPIENT_FIELDS)
+        return f"Plantilla inválida ({e}). Campos disponibles: {fields}"
+    return None
+
+
+class MessageTemplates:
+    """
+    Plantillas compiladas por (canal, tipo, días, idioma).
+
+    Las filas activas de ReminderTemplate se leen una sola vez; cada clave se
+    compila la primera vez que se usa y luego solo se sustituyen los campos del
+    destinatario.
+    """
+
+    def __init__(self, locale=None):
+        self.locale = locale or settings.LANGUAGE_CODE.split("-")[0]
+        self.rows = {
+            (row.channel, row.tipo, row.days_bucket, row.locale): (row.subject, row.body)
+            for row in ReminderTemplate.objects.filter(is_active=True)
+        }
+        self._compiled = {}
+
+    def get(self, channel, tipo, days_left, locale=None):
+        key = (channel, tipo, DaysBucket.for_days(days_left), locale or self.locale)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = self._compile(*key)
+        return compiled
+
+    def render(self, channel, vigencia, days_left, locale=None):
+        """(asunto, cuerpo) de un recordatorio"""
+        subject, body = self.get(channel, vigencia.tipo, days_left, locale)
+        vehicle = vigencia.vehicle
+        fields = {
+            "usuario": vehicle.owner.username,
+            "vehiculo": vehicle.alias,
+            "placa": vehicle.plate,
+            "fecha": vigencia.fecha_vencimiento,
+            "dias": days_left,
+        }
+        return subject.format(**fields), body.format(**fields)
+
+    def _compile(self, channel, tipo, bucket, locale):
+        static = {"tipo": TIPO_LABELS.get(tipo, tipo), "url": settings.BASE_URL}
+        for candidate in ((tipo, bucket), ("", bucket), (tipo, ""), ("", "")):
+            row = self.rows.get((channel, *candidate, locale))
+            if row is None:
+                continue
+            if any(validate_template(text) for text in row):
+                logger.error(f"Plantilla de recordatorio inválida {channel} {candidate}, se ignora")
+                continue
+            return tuple(compile_template(text, static) for text in row)
+        default = DEFAULT_TEMPLATES.get((channel, bucket)) or DEFAULT_TEMPLATES[(channel, DaysBucket.ANY)]
+        return tuple(compile_template(text, static) for text in default)
+
+
+_lock = threading.Lock()
+_cache = {"templates": None, "version": None, "checked": 0.0}
+
+
+def get_templates():
+    """
+    MessageTemplates compartido por el proceso.
+
+    Cada REMINDERS_TEMPLATES_CHECK_SECONDS se mira si cambió alguna plantilla
+    (máximo updated_at y cantidad de filas), así una edición en el admin llega
+    también a los demás procesos sin reiniciarlos.
+    """
+    with _lock:
+        now = time.monotonic()
+        if _cache["templates"] is not None and now - _cache["checked"] < settings.REMINDERS_TEMPLATES_CHECK_SECONDS:
+            return _cache["templates"]
+        version = tuple(ReminderTemplate.objects.aggregate(Max("updated_at"), Count("id")).values())
+        if _cache["templates"] is None or version != _cache["version"]:
+            _cache["templates"] = MessageTemplates()
+            _cache["version"] = version
+        _cache["checked"] = now
+        return _cache["templates"]
+
+
+def clear_template_cache():
+    with _lock:
+        _cache["templates"] = None
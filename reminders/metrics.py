@@ -0,0 +1,252 @@
+import bisect
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Límites (segundos) de los buckets de los histogramas de latencia por canal
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Latencia por mensaje: buckets geométricos (1 ms * 1.25^i, ~25% de error) en lugar de
+# guardar cada valor, así la memoria no crece con la cantidad de mensajes
+MESSAGE_LATENCY_BASE = 0.001
+MESSAGE_LATENCY_GROWTH = 1.25
+MESSAGE_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bucket(seconds):
+    if seconds <= MESSAGE_LATENCY_BASE:
+        return 0
+    return math.ceil(math.log(seconds / MESSAGE_LATENCY_BASE, MESSAGE_LATENCY_GROWTH))
+
+
+def _bucket_percentile(counts, fraction):
+    """Cota superior del bucket donde cae el percentil"""
+    target = fraction * sum(counts.values())
+    seen = 0
+    for index in sorted(counts):
+        seen += counts[index]
+        if seen >= target:
+            return MESSAGE_LATENCY_BASE * MESSAGE_LATENCY_GROWTH ** index
+    return 0.0
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class LatencyHistogram:
+    """Buckets de LATENCY_BUCKETS (para Prometheus) y geométricos (para percentiles), sin guardar cada valor"""
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.fine = Counter()
+        self.sum = 0.0
+        self.max = 0.0
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.fine[_bucket(seconds)] += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantiles(self):
+        return " ".join(
+            f"p{fraction * 100:g}={_bucket_percentile(self.fine, fraction):.3f}s" for fraction in MESSAGE_QUANTILES
+        )
+
+    def render(self, name, **labels):
+        lines = []
+        count = 0
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            count += self.buckets[index]
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {self.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {self.sum:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {self.count}")
+        return lines
+
+
+class RunMetrics:
+    """
+    Métricas de una corrida de recordatorios, por canal.
+
+    El dispatcher anota desde sus hilos la duración de cada llamada al
+    proveedor (send_batch), la latencia de cada mensaje de encolado a enviado
+    (espera en la cola más envío, por canal y por clase de cliente empresa /
+    individual), los resultados y la cola (mensajes encolados que aún no
+    terminan); el
+    tiempo de base de datos se mide con `db_wrapper` (connection.execute_wrapper)
+    en el hilo principal. `report()` da el resumen para la consola y `write()`
+    el archivo en formato de texto de Prometheus (textfile collector de
+    node-exporter).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Por canal: llamada al proveedor (un lote) y espera en cola + envío (cada mensaje)
+        self.provider_latency = defaultdict(LatencyHistogram)
+        self.queue_send_latency = defaultdict(LatencyHistogram)
+        self.results = defaultdict(lambda: {"sent": 0, "failed": 0})
+        self.depth = defaultdict(int)
+        self.max_depth = defaultdict(int)
+        self.message_latency = defaultdict(Counter)
+        self.message_latency_sum = defaultdict(float)
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self._lock = threading.Lock()
+
+    def queued(self, channel, count=1):
+        with self._lock:
+            self.depth[channel] += count
+            self.max_depth[channel] = max(self.max_depth[channel], self.depth[channel])
+
+    def observe_batch(self, channel, seconds, results):
+        """Resultados de un lote y `seconds`, lo que tardó su send_batch"""
+        ok = sum(1 for result in results if result.ok)
+        with self._lock:
+            self.provider_latency[channel].observe(seconds)
+            self.results[channel]["sent"] += ok
+            self.results[channel]["failed"] += len(results) - ok
+            self.depth[channel] -= len(results)
+
+    def observe_messages(self, channel, observations):
+        """(clase de cliente, segundos desde que se encoló) de cada mensaje de un lote de `channel`"""
+        with self._lock:
+            for tenant, seconds in observations:
+                self.queue_send_latency[channel].observe(seconds)
+                self.message_latency[tenant][_bucket(seconds)] += 1
+                self.message_latency_sum[tenant] += seconds
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.db_queries += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def report(self):
+        elapsed = max(self.elapsed, 1e-9)
+        lines = []
+        for channel in sorted(self.results):
+            counts = self.results[channel]
+            provider = self.provider_latency[channel]
+            queue_send = self.queue_send_latency[channel]
+            lines.append(
+                f"{channel}: {counts['sent']} ok / {counts['failed']} fallidos "
+                f"({counts['sent'] / elapsed:.1f}/s ok, {counts['failed'] / elapsed:.1f}/s fallidos) | "
+                f"proveedor {provider.quantiles()} máx={provider.max:.3f}s | "
+                f"cola+envío {queue_send.quantiles()} máx={queue_send.max:.3f}s | cola máx={self.max_depth[channel]}"
+            )
+        for tenant in sorted(self.message_latency):
+            counts = self.message_latency[tenant]
+            quantiles = " ".join(
+                f"p{fraction * 100:g}={_bucket_percentile(counts, fraction):.3f}s" for fraction in MESSAGE_QUANTILES
+            )
+            lines.append(f"Latencia {tenant}: {quantiles} ({sum(counts.values())} mensajes)")
+        lines.append(f"Base de datos: {self.db_seconds:.2f}s en {self.db_queries} consultas")
+        return "\n".join(lines)
+
+    def render(self, timer=None, **labels):
+        """Texto en formato de exposición de Prometheus"""
+        elapsed = max(self.elapsed, 1e-9)
+        out = [
+            "# HELP reminders_provider_call_seconds Duración de cada llamada al proveedor (un lote), por canal.",
+            "# TYPE reminders_provider_call_seconds histogram",
+        ]
+        for channel in sorted(self.provider_latency):
+            out += self.provider_latency[channel].render("reminders_provider_call_seconds", channel=channel, **labels)
+        out += [
+            "# HELP reminders_queue_send_latency_seconds Espera en cola más envío, de encolado a enviado, por mensaje y canal.",
+            "# TYPE reminders_queue_send_latency_seconds histogram",
+        ]
+        for channel in sorted(self.queue_send_latency):
+            out += self.queue_send_latency[channel].render("reminders_queue_send_latency_seconds", channel=channel, **labels)
+
+        out += [
+            "# HELP reminders_messages Mensajes enviados o fallidos en la última corrida.",
+            "# TYPE reminders_messages gauge",
+        ]
+        for channel in sorted(self.results):
+            for result, count in self.results[channel].items():
+                out.append(f"reminders_messages{_labels(channel=channel, result=result, **labels)} {count}")
+        out += [
+            "# HELP reminders_messages_per_second Mensajes por segundo en la última corrida.",
+            "# TYPE reminders_messages_per_second gauge",
+        ]
+        for channel in sorted(self.results):
+            for result, count in self.results[channel].items():
+                out.append(
+                    f"reminders_messages_per_second{_labels(channel=channel, result=result, **labels)} {count / elapsed:.3f}"
+                )
+        out += [
+            "# HELP reminders_queue_depth_max Máximo de mensajes encolados sin terminar en el dispatcher.",
+            "# TYPE reminders_queue_depth_max gauge",
+        ]
+        for channel in sorted(self.max_depth):
+            out.append(f"reminders_queue_depth_max{_labels(channel=channel, **labels)} {self.max_depth[channel]}")
+
+        out += [
+            "# HELP reminders_message_latency_seconds Espera en cola más envío por mensaje, por clase de cliente.",
+            "# TYPE reminders_message_latency_seconds summary",
+        ]
+        for tenant in sorted(self.message_latency):
+            counts = self.message_latency[tenant]
+            for fraction in MESSAGE_QUANTILES:
+                out.append(
+                    f"reminders_message_latency_seconds{_labels(tenant_class=tenant, quantile=fraction, **labels)} "
+                    f"{_bucket_percentile(counts, fraction):.6f}"
+                )
+            out.append(
+                f"reminders_message_latency_seconds_sum{_labels(tenant_class=tenant, **labels)} "
+                f"{self.message_latency_sum[tenant]:.6f}"
+            )
+            out.append(
+                f"reminders_message_latency_seconds_count{_labels(tenant_class=tenant, **labels)} {sum(counts.values())}"
+            )
+
+        out += [
+            "# HELP reminders_db_seconds Tiempo en consultas a la base de datos.",
+            "# TYPE reminders_db_seconds gauge",
+            f"reminders_db_seconds{_labels(**labels)} {self.db_seconds:.6f}",
+            "# HELP reminders_db_queries Consultas a la base de datos.",
+            "# TYPE reminders_db_queries gauge",
+            f"reminders_db_queries{_labels(**labels)} {self.db_queries}",
+        ]
+        if timer is not None:
+            out += [
+                "# HELP reminders_phase_seconds Tiempo de pared por fase de send_reminders.",
+                "# TYPE reminders_phase_seconds gauge",
+            ]
+            for phase, seconds in sorted(timer.totals.items()):
+                out.append(f"reminders_phase_seconds{_labels(phase=phase, **labels)} {seconds:.6f}")
+        out += [
+            "# HELP reminders_run_duration_seconds Duración de la última corrida.",
+            "# TYPE reminders_run_duration_seconds gauge",
+            f"reminders_run_duration_seconds{_labels(**labels)} {elapsed:.6f}",
+            "# HELP reminders_last_run_timestamp_seconds Fin de la última corrida (epoch).",
+            "# TYPE reminders_last_run_timestamp_seconds gauge",
+            f"reminders_last_run_timestamp_seconds{_labels(**labels)} {time.time():.0f}",
+        ]
+        return "\n".join(out) + "\n"
+
+    def write(self, path, timer=None, **labels):
+        """Escribe el archivo de forma atómica (el collector nunca lee uno a medias)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render(timer, **labels), encoding="utf-8")
+        os.replace(tmp, path)
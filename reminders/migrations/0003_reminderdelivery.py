@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 10:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_vigencia_activo_fecha_idx'),
+        ('reminders', '0002_alter_notificationlog_channel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('EMAIL', 'Email'), ('WHATSAPP', 'WhatsApp'), ('PUSH', 'Push')], max_length=12)),
+                ('offset_day', models.SmallIntegerField()),
+                ('target_date', models.DateField()),
+                ('status', models.CharField(choices=[('CLAIMED', 'Reclamado'), ('SENT', 'Enviado')], default='CLAIMED', max_length=10)),
+                ('run_id', models.CharField(max_length=32)),
+                ('claimed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('vigencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='core.vigencia')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['target_date', 'vigencia'], name='reminders_r_target__d37f48_idx'), models.Index(fields=['run_id'], name='reminders_r_run_id_398d82_idx')],
+                'constraints': [models.UniqueConstraint(fields=('vigencia', 'channel', 'offset_day', 'target_date'), name='uniq_reminder_delivery')],
+            },
+        ),
+    ]
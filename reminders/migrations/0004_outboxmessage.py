@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 11:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_vigencia_activo_fecha_idx'),
+        ('reminders', '0003_reminderdelivery'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reminderdelivery',
+            name='status',
+            field=models.CharField(choices=[('CLAIMED', 'Reclamado'), ('QUEUED', 'En outbox'), ('SENT', 'Enviado')], default='CLAIMED', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('EMAIL', 'Email'), ('WHATSAPP', 'WhatsApp'), ('PUSH', 'Push')], max_length=12)),
+                ('recipient', models.CharField(max_length=255)),
+                ('days_left', models.SmallIntegerField()),
+                ('subject', models.CharField(blank=True, default='', max_length=255)),
+                ('body', models.TextField(blank=True, default='')),
+                ('tokens', models.JSONField(blank=True, default=list)),
+                ('items', models.JSONField(blank=True, default=list)),
+                ('target_date', models.DateField()),
+                ('run_id', models.CharField(max_length=32)),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('PROCESSING', 'Procesando'), ('SENT', 'Enviado'), ('FAILED', 'Fallido')], default='PENDING', max_length=10)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('vigencia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_messages', to='core.vigencia')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='reminders_o_status_08260c_idx'), models.Index(fields=['locked_by', 'status'], name='reminders_o_locked__acf555_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0005_reminder_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('EMAIL', 'Email'), ('WHATSAPP', 'WhatsApp'), ('PUSH', 'Push')], max_length=12)),
+                ('tipo', models.CharField(blank=True, choices=[('SOAT', 'SOAT'), ('TECNO', 'Tecnomecánica'), ('SEGURO', 'Seguro'), ('IMPUESTO', 'Impuesto'), ('OTRO', 'Otro')], default='', help_text='Vacío: cualquier tipo de vigencia.', max_length=12)),
+                ('days_bucket', models.CharField(blank=True, choices=[('', 'Cualquiera'), ('0', 'Vence hoy'), ('1', '1 día'), ('7', '2 a 7 días'), ('15', '8 a 15 días'), ('30', 'Más de 15 días')], default='', max_length=2)),
+                ('locale', models.CharField(default='es', max_length=10)),
+                ('subject', models.CharField(blank=True, default='', help_text='Solo email y push.', max_length=200)),
+                ('body', models.TextField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('channel', 'tipo', 'days_bucket', 'locale'), name='uniq_reminder_template')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0007_outbox_retry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['vigencia', 'created_at'], name='reminders_n_vigenci_104f3c_idx'),
+        ),
+    ]
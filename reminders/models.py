@@ -1,11 +1,13 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
-from core.models import Vigencia
+from core.models import Vigencia, VigenciaType
 
 
 class ChannelChoices(models.TextChoices):
     EMAIL = "EMAIL", "Email"
     WHATSAPP = "WHATSAPP", "WhatsApp"
+    PUSH = "PUSH", "Push"
 
 
 class StatusChoices(models.TextChoices):
@@ -15,11 +17,196 @@ class StatusChoices(models.TextChoices):
 
 
 class NotificationLog(models.Model):
+    """
+    Un envío (u omisión) por vigencia y canal. archive_notification_logs
+    pasa los meses viejos a JSONL comprimido para que la tabla no crezca sin fin.
+    """
     vigencia = models.ForeignKey(Vigencia, on_delete=models.CASCADE, related_name="notification_logs")
     channel = models.CharField(max_length=12, choices=ChannelChoices.choices)
     status = models.CharField(max_length=10, choices=StatusChoices.choices)
     message = models.CharField(max_length=255, blank=True, default="")
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["vigencia", "created_at"]),
+        ]
+
     def __str__(self):
         return f"{self.vigencia_id} {self.channel} {self.status} {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class DeliveryStatus(models.TextChoices):
+    CLAIMED = "CLAIMED", "Reclamado"
+    QUEUED = "QUEUED", "En outbox"
+    SENT = "SENT", "Enviado"
+
+
+class ReminderDelivery(models.Model):
+    """
+    Ledger de entregas: como máximo un recordatorio por vigencia, canal, días
+    antes del vencimiento y fecha objetivo. Una corrida reclama la fila antes
+    de enviar, así reintentos o crons solapados no duplican envíos.
+    """
+    vigencia = models.ForeignKey(Vigencia, on_delete=models.CASCADE, related_name="deliveries")
+    channel = models.CharField(max_length=12, choices=ChannelChoices.choices)
+    offset_day = models.SmallIntegerField()
+    target_date = models.DateField()
+    status = models.CharField(max_length=10, choices=DeliveryStatus.choices, default=DeliveryStatus.CLAIMED)
+    run_id = models.CharField(max_length=32)
+    claimed_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["vigencia", "channel", "offset_day", "target_date"],
+                name="uniq_reminder_delivery",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["target_date", "vigencia"]),
+            models.Index(fields=["run_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.vigencia_id} {self.channel} -{self.offset_day}d {self.target_date} {self.status}"
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = "PENDING", "Pendiente"
+    PROCESSING = "PROCESSING", "Procesando"
+    SENT = "SENT", "Enviado"
+    FAILED = "FAILED", "Fallido"
+
+
+class OutboxMessage(models.Model):
+    """
+    Mensaje saliente ya renderizado, pendiente de envío.
+
+    send_reminders --outbox los inserta en bloque junto con su reclamo en el
+    ledger (misma transacción) y drain_outbox los envía. También es la cola
+    de reintentos: un envío fallido vuelve a PENDING con `next_attempt_at`
+    más adelante (backoff exponencial) hasta REMINDERS_RETRY_MAX_ATTEMPTS.
+    """
+    vigencia = models.ForeignKey(Vigencia, on_delete=models.CASCADE, related_name="outbox_messages")
+    channel = models.CharField(max_length=12, choices=ChannelChoices.choices)
+    recipient = models.CharField(max_length=255)
+    days_left = models.SmallIntegerField()
+    subject = models.CharField(max_length=255, blank=True, default="")
+    body = models.TextField(blank=True, default="")
+    tokens = models.JSONField(default=list, blank=True)
+    # Digest: [[vigencia_id, days_left], ...] de las vigencias agrupadas
+    items = models.JSONField(default=list, blank=True)
+
+    target_date = models.DateField()
+    run_id = models.CharField(max_length=32)
+    status = models.CharField(max_length=10, choices=OutboxStatus.choices, default=OutboxStatus.PENDING)
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["locked_by", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} {self.recipient} {self.status}"
+
+
+class ReminderCheckpoint(models.Model):
+    """
+    Hasta dónde llegó send_reminders en una fecha (y shard), en el orden
+    (owner_id, id) en que recorre las vigencias. Con --resume se retoma desde ahí.
+    """
+    target_date = models.DateField()
+    shard = models.CharField(max_length=20, blank=True, default="")
+    last_owner_id = models.BigIntegerField(default=0)
+    last_id = models.BigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["target_date", "shard"], name="uniq_reminder_checkpoint"),
+        ]
+
+    def __str__(self):
+        return f"{self.target_date} {self.shard or '-'} ({self.last_owner_id}, {self.last_id})"
+
+
+class DaysBucket(models.TextChoices):
+    ANY = "", "Cualquiera"
+    TODAY = "0", "Vence hoy"
+    ONE = "1", "1 día"
+    WEEK = "7", "2 a 7 días"
+    FORTNIGHT = "15", "8 a 15 días"
+    MONTH = "30", "Más de 15 días"
+
+    @classmethod
+    def for_days(cls, days_left):
+        if days_left == 0:
+            return cls.TODAY
+        if days_left == 1:
+            return cls.ONE
+        if days_left <= 7:
+            return cls.WEEK
+        if days_left <= 15:
+            return cls.FORTNIGHT
+        return cls.MONTH
+
+
+class ReminderTemplate(models.Model):
+    """
+    Plantilla de recordatorio editable desde el admin, con la sintaxis de
+    str.format: {usuario} {tipo} {vehiculo} {placa} {fecha} {dias} {url}.
+    Se usa la más específica que coincida; si no hay ninguna, la del código.
+    """
+    channel = models.CharField(max_length=12, choices=ChannelChoices.choices)
+    tipo = models.CharField(
+        max_length=12, choices=VigenciaType.choices, blank=True, default="",
+        help_text="Vacío: cualquier tipo de vigencia.",
+    )
+    days_bucket = models.CharField(
+        max_length=2, choices=DaysBucket.choices, blank=True, default=DaysBucket.ANY,
+    )
+    locale = models.CharField(max_length=10, default="es")
+    subject = models.CharField(max_length=200, blank=True, default="", help_text="Solo email y push.")
+    body = models.TextField()
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["channel", "tipo", "days_bucket", "locale"],
+                name="uniq_reminder_template",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} {self.tipo or '*'} {self.days_bucket or '*'} ({self.locale})"
+
+    def clean(self):
+        from reminders.message_templates import validate_template
+        for field in ("subject", "body"):
+            error = validate_template(getattr(self, field))
+            if error:
+                raise ValidationError({field: error})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from reminders.message_templates import clear_template_cache
+        clear_template_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from reminders.message_templates import clear_template_cache
+        clear_template_cache()
+        return result
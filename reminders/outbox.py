@@ -0,0 +1,143 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Vigencia
+from reminders.dispatcher import ReminderMessage
+from reminders.models import OutboxMessage, OutboxStatus
+from reminders.retry import next_attempt_at
+
+
+def enqueue(messages, ledger, attempts=0, errors=None, not_before=None, send_at=None):
+    """
+    Guarda en el outbox los mensajes ya reclamados en el ledger (una sola transacción).
+
+    Con `attempts` > 0 son reintentos de envíos que ya fallaron (`errors`, uno
+    por mensaje) y salen pasado su backoff; con `not_before` esperan hasta esa
+    hora (canal con el circuito abierto). `send_at(message)` da la hora de
+    envío de cada mensaje (send_reminders --spread-over).
+    """
+    now = timezone.now()
+    rows = []
+    for index, message in enumerate(messages):
+        if not_before is not None:
+            when = not_before
+        elif send_at is not None:
+            when = send_at(message)
+        else:
+            when = next_attempt_at(attempts, now) if attempts else now
+        rows.append(OutboxMessage(
+            vigencia=message.vigencia,
+            channel=message.channel,
+            recipient=message.recipient,
+            days_left=message.days_left,
+            subject=message.subject[:255],
+            body=message.body,
+            tokens=list(message.tokens),
+            items=[[item.vigencia.pk, item.days_left] for item in message.items],
+            target_date=ledger.target_date,
+            run_id=ledger.run_id,
+            attempts=attempts,
+            next_attempt_at=when,
+            last_error=str(errors[index])[:255] if errors else "",
+        ))
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_create(rows, batch_size=500)
+        ledger.mark_queued([item for m in messages for item in (m.items or (m,))])
+    return len(rows)
+
+
+def claim_batch(worker_id, size):
+    """
+    Toma hasta `size` mensajes pendientes (y ya vencidos, si son reintentos) para este worker.
+
+    Con SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL, MySQL 8) varios workers
+    leen lotes distintos sin esperarse. En SQLite se usa un UPDATE condicionado
+    a status=PENDING: si dos workers eligen la misma fila, solo uno la cambia.
+    """
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    pending = OutboxMessage.objects.filter(
+        status=OutboxStatus.PENDING, next_attempt_at__lte=timezone.now(),
+    ).order_by("next_attempt_at", "id")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(pending.select_for_update(skip_locked=True).values_list("id", flat=True)[:size])
+            OutboxMessage.objects.filter(id__in=ids).update(
+                status=OutboxStatus.PROCESSING, locked_by=token, locked_at=timezone.now(),
+            )
+    else:
+        ids = list(pending.values_list("id", flat=True)[:size])
+        OutboxMessage.objects.filter(id__in=ids, status=OutboxStatus.PENDING).update(
+            status=OutboxStatus.PROCESSING, locked_by=token, locked_at=timezone.now(),
+        )
+
+    return list(
+        OutboxMessage.objects.filter(locked_by=token, status=OutboxStatus.PROCESSING)
+        .select_related(
+            "vigencia", "vigencia__vehicle", "vigencia__vehicle__owner", "vigencia__vehicle__owner__usuarioempresa",
+        )
+        .order_by("id")
+    )
+
+
+def requeue_stale(minutes=None):
+    """Devuelve a PENDING los mensajes de workers que murieron a mitad de lote"""
+    minutes = settings.REMINDERS_CLAIM_STALE_MINUTES if minutes is None else minutes
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    return OutboxMessage.objects.filter(
+        status=OutboxStatus.PROCESSING, locked_at__lt=cutoff,
+    ).update(status=OutboxStatus.PENDING, locked_by="", locked_at=None)
+
+
+def retry_later(row, error, now):
+    """
+    Reprograma un envío fallido con backoff exponencial. Retorna False (y lo
+    deja FAILED) si ya agotó REMINDERS_RETRY_MAX_ATTEMPTS.
+    """
+    attempts = row.attempts + 1
+    update = {"attempts": attempts, "last_error": str(error)[:255], "locked_by": "", "locked_at": None}
+    if attempts >= settings.REMINDERS_RETRY_MAX_ATTEMPTS:
+        OutboxMessage.objects.filter(id=row.id).update(status=OutboxStatus.FAILED, **update)
+        return False
+    OutboxMessage.objects.filter(id=row.id).update(
+        status=OutboxStatus.PENDING, next_attempt_at=next_attempt_at(attempts, now), **update,
+    )
+    return True
+
+
+def defer(ids, until):
+    """Devuelve mensajes a pendientes hasta `until` sin gastar un intento (circuito abierto)"""
+    return OutboxMessage.objects.filter(id__in=ids).update(
+        status=OutboxStatus.PENDING, next_attempt_at=until, locked_by="", locked_at=None,
+    )
+
+
+def to_reminder_messages(rows):
+    """OutboxMessage -> ReminderMessage, cargando de una vez las vigencias de los digests"""
+    item_ids = {vigencia_id for row in rows for vigencia_id, _ in row.items}
+    vigencias = Vigencia.objects.select_related("vehicle", "vehicle__owner").in_bulk(item_ids)
+
+    messages = []
+    for row in rows:
+        items = tuple(
+            ReminderMessage(vigencia=vigencias[vigencia_id], channel=row.channel,
+                            recipient=row.recipient, days_left=days_left)
+            for vigencia_id, days_left in row.items
+            if vigencia_id in vigencias
+        )
+        messages.append(ReminderMessage(
+            vigencia=row.vigencia,
+            channel=row.channel,
+            recipient=row.recipient,
+            days_left=row.days_left,
+            subject=row.subject,
+            body=row.body,
+            tokens=tuple(row.tokens),
+            items=items,
+            outbox_id=row.id,
+        ))
+    return messages
@@ -0,0 +1,86 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# Orden y nombre con que se reportan las fases de send_reminders
+PHASES = (
+    ("query", "consulta"),
+    ("decision", "decisión"),
+    ("render", "render"),
+    ("dispatch", "envío"),
+    ("write", "escritura"),
+)
+
+
+class PhaseTimer:
+    """
+    Acumula el tiempo de pared por fase.
+
+    Las fases se pueden anidar: mientras corre una interna, el tiempo no se
+    le suma a la de afuera, así las fases no se solapan y suman el total.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._stack = []
+        self._started = None
+
+    @contextmanager
+    def phase(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            self.totals[self._stack[-1]] += now - self._started
+        self._stack.append(name)
+        self._started = now
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.totals[self._stack.pop()] += now - self._started
+            self._started = now
+
+    def timed(self, iterable, name):
+        """Itera `iterable` sumando a `name` lo que tarda cada next()"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def report(self):
+        parts = [f"{label}={self.totals.get(name, 0.0):.2f}s" for name, label in PHASES]
+        return "Tiempos: " + " | ".join(parts)
+
+
+class PlanWriter:
+    """Escribe en JSONL cada mensaje que send_reminders enviaría, sin enviarlo"""
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        return False
+
+    def write(self, message):
+        line = {
+            "channel": message.channel,
+            "recipient": message.recipient,
+            "vigencia_id": message.vigencia.pk,
+            "offset": message.days_left,
+        }
+        if message.items:
+            line["items"] = [[item.vigencia.pk, item.days_left] for item in message.items]
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self.written += 1
@@ -0,0 +1,58 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+
+
+def backoff_delay(attempts, base=None, cap=None, rng=random):
+    """
+    Segundos de espera antes del intento siguiente a `attempts` fallidos.
+
+    Exponencial (base * 2^(attempts-1), con tope `cap`) con jitter: la mitad
+    fija y la otra al azar, para que los reintentos de una caída no vuelvan
+    todos en el mismo segundo.
+    """
+    base = settings.REMINDERS_RETRY_BASE_SECONDS if base is None else base
+    cap = settings.REMINDERS_RETRY_MAX_SECONDS if cap is None else cap
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def next_attempt_at(attempts, now):
+    return now + timedelta(seconds=backoff_delay(attempts))
+
+
+class CircuitBreaker:
+    """
+    Corta un canal tras `threshold` fallos seguidos durante `cooldown` segundos.
+
+    Pasado ese tiempo vuelve a dejar pasar envíos (medio abierto): el primer
+    éxito lo cierra y un fallo lo abre de nuevo de inmediato.
+    """
+
+    def __init__(self, threshold=None, cooldown=None, clock=time.monotonic):
+        self.threshold = max(1, threshold or settings.REMINDERS_BREAKER_THRESHOLD)
+        self.cooldown = settings.REMINDERS_BREAKER_COOLDOWN_SECONDS if cooldown is None else cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and self.clock() - self.opened_at < self.cooldown
+
+    def retry_in(self):
+        """Segundos que faltan para que deje pasar envíos otra vez"""
+        if not self.is_open:
+            return 0
+        return self.cooldown - (self.clock() - self.opened_at)
+
+    def record(self, ok):
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = self.clock()
@@ -0,0 +1,110 @@
+import heapq
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Vigencia
+from reminders.retry import next_attempt_at
+
+
+class ReminderSchedule:
+    """
+    Agenda en memoria de los próximos recordatorios: un heap de
+    (hora de envío, vigencia_id) para las vigencias con next_reminder_at
+    dentro del horizonte (hoy + `horizon_days`).
+
+    Las entradas viejas no se sacan del heap: `scheduled` guarda la hora
+    vigente de cada vigencia y al salir del heap se descarta lo que no coincida.
+    Los envíos fallidos vuelven a la agenda con backoff (`retry`).
+
+    apply_changes solo ve lo guardado con save() (updated_at); las vigencias
+    borradas o desactivadas con update() siguen en la agenda hasta su hora,
+    por eso `active` las vuelve a revisar en la base de datos antes de enviar.
+    `send_hour` es una sola hora para todos los usuarios.
+    """
+
+    def __init__(self, send_hour, horizon_days=2):
+        self.send_hour = send_hour
+        self.horizon_days = horizon_days
+        self.horizon = None
+        self.scheduled = {}
+        self.failures = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self.scheduled)
+
+    def due_at(self, reminder_date):
+        """Momento de envío (hora local) de un recordatorio que cae en `reminder_date`"""
+        return timezone.make_aware(datetime.combine(reminder_date, time(self.send_hour)))
+
+    def load(self, today):
+        """
+        Carga (o extiende hasta el nuevo horizonte) la agenda desde la base de datos.
+
+        Siempre incluye lo ya vencido (next_reminder_at <= today): lo que
+        quedó sin enviar no se pierde al recargar.
+        """
+        horizon = today + timedelta(days=self.horizon_days)
+        qs = Vigencia.objects.filter(activo=True, next_reminder_at__lte=horizon)
+        if self.horizon is not None:
+            qs = qs.filter(Q(next_reminder_at__lte=today) | Q(next_reminder_at__gt=self.horizon))
+        self.failures = {}
+        loaded = 0
+        for vigencia_id, reminder_date in qs.values_list("id", "next_reminder_at").iterator(chunk_size=2000):
+            self._push(vigencia_id, reminder_date)
+            loaded += 1
+        self.horizon = horizon
+        return loaded
+
+    def apply_changes(self, since):
+        """Reagenda las vigencias modificadas desde `since`; retorna cuántas"""
+        changed = 0
+        rows = Vigencia.objects.filter(updated_at__gte=since).values_list("id", "activo", "next_reminder_at")
+        for vigencia_id, activo, reminder_date in rows.iterator(chunk_size=2000):
+            if activo and reminder_date and reminder_date <= self.horizon:
+                self._push(vigencia_id, reminder_date)
+            else:
+                self.scheduled.pop(vigencia_id, None)
+            changed += 1
+        return changed
+
+    def next_due(self):
+        """Hora del próximo envío agendado, o None"""
+        while self._heap:
+            due, vigencia_id = self._heap[0]
+            if self.scheduled.get(vigencia_id) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now):
+        """Saca de la agenda y retorna los ids cuyo envío ya llegó"""
+        ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due, vigencia_id = heapq.heappop(self._heap)
+            if self.scheduled.get(vigencia_id) == due:
+                del self.scheduled[vigencia_id]
+                ids.append(vigencia_id)
+        return ids
+
+    def active(self, ids):
+        """De `ids`, los que todavía existen y siguen activos (en una consulta)"""
+        found = set(Vigencia.objects.filter(id__in=ids, activo=True).values_list("id", flat=True))
+        return [vigencia_id for vigencia_id in ids if vigencia_id in found]
+
+    def retry(self, ids, now):
+        """Reagenda con backoff exponencial los envíos que fallaron"""
+        for vigencia_id in ids:
+            attempts = self.failures[vigencia_id] = self.failures.get(vigencia_id, 0) + 1
+            self._push_at(vigencia_id, next_attempt_at(attempts, now))
+
+    def _push(self, vigencia_id, reminder_date):
+        self._push_at(vigencia_id, self.due_at(reminder_date))
+
+    def _push_at(self, vigencia_id, due):
+        if self.scheduled.get(vigencia_id) == due:
+            return
+        self.scheduled[vigencia_id] = due
+        heapq.heappush(self._heap, (due, vigencia_id))
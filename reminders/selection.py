@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.db.models.functions import Mod
+
+from core.models import REMINDER_OFFSETS, Vigencia
+
+
+def candidate_dates(today):
+    """Fechas de vencimiento que pueden generar un recordatorio en `today`"""
+    return [today + timedelta(days=offset) for offset in REMINDER_OFFSETS]
+
+
+def candidate_queryset(today, shard=None):
+    """
+    Vigencias activas con un recordatorio pendiente para `today` o antes.
+
+    Es un rango sobre el índice (activo, next_reminder_at): la columna ya
+    resume fecha_vencimiento, r30..r1 y los días de aviso del dueño, así la
+    base de datos solo devuelve las filas que pueden disparar. Con `shard`
+    (index, count) solo devuelve los dueños con owner_id % count == index.
+    """
+    qs = Vigencia.objects.filter(
+        activo=True,
+        next_reminder_at__lte=today,
+    ).select_related(
+        "vehicle", "vehicle__owner", "vehicle__owner__profile", "vehicle__owner__usuarioempresa",
+    )
+    if shard:
+        index, count = shard
+        qs = qs.alias(shard_key=Mod("vehicle__owner_id", count)).filter(shard_key=index)
+    return qs
+
+
+def iter_candidates(qs, after=(0, 0), chunk_size=500):
+    """
+    Recorre `qs` en orden (owner_id, id) por páginas con keyset pagination.
+
+    Cada página es una consulta por rango (después de la última (owner_id, id)
+    leída) con LIMIT `chunk_size`: en memoria vive una sola página aunque el
+    driver (mysqlclient) traiga el resultado completo de cada consulta, y no
+    depende de OFFSET. `after` retoma después de esa posición (checkpoint).
+    """
+    last_owner_id, last_id = after
+    qs = qs.order_by("vehicle__owner_id", "id")
+    while True:
+        page = list(qs.filter(
+            Q(vehicle__owner_id__gt=last_owner_id) | Q(vehicle__owner_id=last_owner_id, id__gt=last_id)
+        )[:chunk_size])
+        if not page:
+            return
+        yield from page
+        last_owner_id, last_id = page[-1].vehicle.owner_id, page[-1].id
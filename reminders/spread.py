@@ -0,0 +1,42 @@
+import re
+import zlib
+from datetime import timedelta
+
+_DURATION = re.compile(r"(\d+)\s*([hms]?)")
+_UNITS = {"h": 3600, "m": 60, "s": 1, "": 1}
+
+
+def parse_duration(value):
+    """'2h', '90m', '1h30m', '45s' o '3600' -> segundos"""
+    text = str(value).strip().lower()
+    parts = _DURATION.findall(text)
+    if not parts or _DURATION.sub("", text).strip():
+        raise ValueError(f"Duración inválida: {value!r} (ej: 2h, 90m, 1h30m)")
+    seconds = sum(int(amount) * _UNITS[unit] for amount, unit in parts)
+    if seconds <= 0:
+        raise ValueError(f"La duración debe ser mayor que cero: {value!r}")
+    return seconds
+
+
+class SendSpreader:
+    """
+    Reparte los envíos de una corrida en una ventana de `window` segundos.
+
+    Cada dueño tiene un segundo fijo dentro de la ventana (crc32 de su id),
+    así todos sus mensajes salen juntos y a la misma hora cada día, y los
+    dueños quedan repartidos de forma pareja.
+    """
+
+    def __init__(self, window, start):
+        self.window = max(1, int(window))
+        self.start = start
+
+    def slot(self, owner_id):
+        return zlib.crc32(str(owner_id).encode()) % self.window
+
+    def send_at(self, message):
+        return self.start + timedelta(seconds=self.slot(message.vigencia.vehicle.owner_id))
+
+    @property
+    def end(self):
+        return self.start + timedelta(seconds=self.window)
@@ -0,0 +1,235 @@
+"""
+Proveedores falsos locales (SMTP, Twilio y Firebase) para pruebas de carga
+del envío de recordatorios, con latencia y errores configurables.
+
+send_reminders los usa solo por settings:
+
+- SMTP: EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend,
+  EMAIL_HOST/EMAIL_PORT del SMTPSink y EMAIL_USE_TLS=False.
+- Twilio: WHATSAPP_ENABLED=True y TWILIO_API_BASE_URL del TwilioStandIn.
+- Firebase: FIREBASE_MESSAGING_BACKEND=reminders.standins.FakeMessaging
+  (latencia y errores con STANDIN_FCM_LATENCY / STANDIN_FCM_ERROR_RATE).
+
+run_standins levanta SMTP y Twilio como servidores; benchmark_reminders
+--pipeline los usa en el mismo proceso.
+"""
+import asyncio
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from firebase_admin import exceptions, messaging
+
+
+class FaultInjector:
+    """Latencia (con jitter de ±50%) y una fracción de errores al azar"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = max(0.0, latency)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if not self.latency:
+            return 0.0
+        with self._lock:
+            return self.latency * self._rng.uniform(0.5, 1.5)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+class SMTPSink:
+    """Servidor SMTP (aiosmtpd) que acepta y descarta los mensajes"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, seed=None):
+        from aiosmtpd.controller import Controller
+
+        # aiosmtpd registra cada comando SMTP en INFO
+        logging.getLogger("mail.log").setLevel(logging.WARNING)
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.received = 0
+        self.rejected = 0
+        self.controller = Controller(self, hostname=host, port=port or _free_port(host))
+
+    @property
+    def host(self):
+        return self.controller.hostname
+
+    @property
+    def port(self):
+        return self.controller.port
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.faults.delay())
+        if self.faults.should_fail():
+            self.rejected += 1
+            return "451 4.3.0 Error inyectado por SMTPSink"
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+    def start(self):
+        self.controller.start()
+        return self
+
+    def stop(self):
+        self.controller.stop()
+
+
+class _TwilioHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        standin = self.server.standin
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with standin.lock:
+            standin.requests += 1
+            throttled = standin.throttle > 0
+            if throttled:
+                standin.throttle -= 1
+            bad_gateway = not throttled and standin.bad_gateway > 0
+            if bad_gateway:
+                standin.bad_gateway -= 1
+            standin.active += 1
+            standin.max_active = max(standin.max_active, standin.active)
+        try:
+            if throttled:
+                self.send_response(429)
+                self.send_header("Retry-After", str(standin.retry_after))
+                self.end_headers()
+                return
+            if bad_gateway:
+                self._html(502, "<html><body><h1>502 Bad Gateway</h1></body></html>")
+                return
+            time.sleep(standin.faults.delay())
+            if standin.faults.should_fail():
+                self._json(500, {"code": 20500, "message": "Error inyectado por TwilioStandIn"})
+                return
+            self._json(201, {"sid": f"SM{standin.requests}", "status": "queued"})
+        finally:
+            with standin.lock:
+                standin.active -= 1
+
+    def _json(self, status, data):
+        self._write(status, "application/json", json.dumps(data).encode())
+
+    def _html(self, status, text):
+        self._write(status, "text/html", text.encode())
+
+    def _write(self, status, content_type, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TwilioStandIn:
+    """
+    Servidor HTTP que imita el endpoint de mensajes de Twilio.
+
+    `throttle` responde 429 (con Retry-After = `retry_after`) a las próximas
+    N peticiones y `bad_gateway` un 502 en HTML (como un proxy caído);
+    `max_active` es la concurrencia máxima que se vio.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, seed=None):
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self.throttle = 0
+        self.bad_gateway = 0
+        self.retry_after = 1
+        self.server = ThreadingHTTPServer((host, port), _TwilioHandler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeMessaging:
+    """
+    Reemplazo de firebase_admin.messaging: construye los mensajes con las
+    clases reales y responde send_each / send_each_for_multicast sin red.
+    Los tokens de `dead` responden UnregisteredError.
+    """
+
+    def __init__(self, latency=None, error_rate=None, dead=(), seed=None):
+        latency = settings.STANDIN_FCM_LATENCY if latency is None else latency
+        error_rate = settings.STANDIN_FCM_ERROR_RATE if error_rate is None else error_rate
+        self.faults = FaultInjector(latency, error_rate, seed)
+        self.dead = set(dead)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(messaging, name)
+
+    def send_each(self, messages, dry_run=False):
+        if len(messages) > 500:
+            raise exceptions.InvalidArgumentError("send_each acepta hasta 500 mensajes")
+        with self._lock:
+            self.calls.append(len(messages))
+        time.sleep(self.faults.delay())
+        return messaging.BatchResponse([self._response(m.token) for m in messages])
+
+    def send_each_for_multicast(self, multicast_message, dry_run=False):
+        return self.send_each([
+            messaging.Message(notification=multicast_message.notification, data=multicast_message.data, token=token)
+            for token in multicast_message.tokens
+        ])
+
+    def _response(self, token):
+        if token in self.dead:
+            return messaging.SendResponse(None, messaging.UnregisteredError("Token no registrado"))
+        if self.faults.should_fail():
+            return messaging.SendResponse(None, exceptions.UnavailableError("Error inyectado por FakeMessaging"))
+        return messaging.SendResponse({"name": f"projects/standin/messages/{token}"}, None)
+
+
+def standin_settings(smtp=None, twilio=None, fcm=False):
+    """Settings que apuntan send_reminders a los proveedores falsos (para override_settings)"""
+    values = {}
+    if smtp is not None:
+        values.update(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=smtp.host, EMAIL_PORT=smtp.port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="", EMAIL_HOST_PASSWORD="",
+        )
+    if twilio is not None:
+        values.update(
+            WHATSAPP_ENABLED=True, TWILIO_API_BASE_URL=twilio.base_url,
+            TWILIO_ACCOUNT_SID="ACstandin", TWILIO_AUTH_TOKEN="standin", TWILIO_WHATSAPP_NUMBER="+14155238886",
+        )
+    if fcm:
+        values["FIREBASE_MESSAGING_BACKEND"] = "reminders.standins.FakeMessaging"
+    return values
+
+
+def _free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+from django.conf import settings
+
+from core.whatsapp_service import WhatsAppService
+from reminders.dispatcher import DeliveryResult
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Limitador token-bucket: `rate` mensajes/seg con ráfagas de hasta `burst`.
+
+    No depende de un event loop (se puede compartir entre hilos que corren cada
+    uno su propio loop). `pause()` congela el bucket, por ejemplo ante un 429.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_take(self):
+        """Toma un token si hay; si no, retorna cuántos segundos esperar"""
+        with self._lock:
+            now = self.clock()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+            self.tokens = 0
+
+
+def parse_retry_after(value, default):
+    """Retry-After en segundos o como fecha HTTP"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class AsyncWhatsAppSender:
+    """
+    Envía recordatorios por la API REST de Twilio con asyncio.
+
+    El ritmo lo pone un TokenBucket (WHATSAPP_RATE_PER_SECOND / WHATSAPP_BURST)
+    y como máximo hay WHATSAPP_MAX_IN_FLIGHT peticiones abiertas. Un 429 pausa el
+    bucket el tiempo que indique Retry-After y el mensaje se reintenta.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None, max_retries=3, bucket=None,
+                 base_url=None, account_sid=None, auth_token=None, from_number=None):
+        self.bucket = bucket or TokenBucket(
+            rate or settings.WHATSAPP_RATE_PER_SECOND,
+            burst or settings.WHATSAPP_BURST,
+        )
+        self.max_in_flight = max(1, max_in_flight or settings.WHATSAPP_MAX_IN_FLIGHT)
+        self.max_retries = max_retries
+        self.base_url = (base_url or settings.TWILIO_API_BASE_URL).rstrip("/")
+        self.account_sid = account_sid or settings.TWILIO_ACCOUNT_SID
+        self.auth_token = auth_token or settings.TWILIO_AUTH_TOKEN
+        self.from_number = f"whatsapp:{from_number or settings.TWILIO_WHATSAPP_NUMBER}"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+
+    def send(self, messages):
+        """Versión bloqueante de send_all (corre su propio event loop)"""
+        return asyncio.run(self.send_all(messages))
+
+    async def send_all(self, messages):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        auth = aiohttp.BasicAuth(self.account_sid, self.auth_token)
+        async with aiohttp.ClientSession(auth=auth) as session:
+            results = await asyncio.gather(*(
+                self._send_one(session, in_flight, message) for message in messages
+            ), return_exceptions=True)
+        # Un error inesperado en un mensaje no debe tumbar a los demás (ya enviados)
+        return [
+            DeliveryResult(message, error=result) if isinstance(result, Exception) else result
+            for message, result in zip(messages, results)
+        ]
+
+    async def _send_one(self, session, in_flight, message):
+        body = message.body or WhatsAppService.build_reminder_message(message.vigencia, message.days_left)
+        data = {"From": self.from_number, "To": f"whatsapp:{message.recipient}", "Body": body}
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with in_flight:
+                    async with session.post(self.url, data=data) as response:
+                        if response.status == 429:
+                            delay = parse_retry_after(response.headers.get("Retry-After"), 2 ** attempt)
+                            logger.warning(f"Twilio 429, pausando {delay:.2f}s")
+                            self.bucket.pause(delay)
+                            error = RuntimeError("Twilio 429: demasiadas solicitudes")
+                            continue
+                        text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                return DeliveryResult(message, error=e)
+
+            # Un proxy delante de Twilio puede responder HTML (502/503) en lugar de JSON
+            try:
+                payload = json.loads(text)
+            except ValueError:
+                payload = None
+            if not isinstance(payload, dict):
+                payload = {"message": text.strip()[:200]}
+
+            if response.status >= 400:
+                return DeliveryResult(
+                    message,
+                    error=RuntimeError(f"Twilio {response.status}: {payload.get('message', '')}"),
+                )
+            return DeliveryResult(message, detail=f"WhatsApp enviado a {message.recipient} ({payload.get('sid')})")
+
+        return DeliveryResult(message, error=error)